@@ -1,36 +1,171 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
-import openai
+from typing import Any, Dict, Iterator, Optional
+import threading
 from config.settings import settings
+from utils.llm_cache import request_key, shared_llm_cache
+from utils.openrouter_client import async_openrouter_client, openrouter_client
 import json
 
+_DEFAULT_CACHE = object()
+
 class BaseAgent(ABC):
-    def __init__(self, model_name: str = None, temperature: float = 0.1):
+    def __init__(self, model_name: str = None, temperature: float = 0.1, cache=_DEFAULT_CACHE,
+                 cache_nondeterministic: bool = None, timeout: float = None):
         self.model_name = model_name or settings.PRIMARY_MODEL
         self.temperature = temperature
+        self.timeout = timeout
         self.client = self._setup_openrouter_client()
+        # Identical requests are answered from the cache; by default only at temperature 0,
+        # where a repeated call would return the same completion anyway
+        self.cache = shared_llm_cache() if cache is _DEFAULT_CACHE else cache
+        self.cache_nondeterministic = (settings.LLM_CACHE_NONDETERMINISTIC
+                                       if cache_nondeterministic is None else cache_nondeterministic)
+        self._cache_counts = {'hits': 0, 'misses': 0}
+        self._cache_counts_lock = threading.Lock()
         
     def _setup_openrouter_client(self):
-        """Setup OpenRouter client"""
-        return openai.OpenAI(
-            base_url=settings.OPENROUTER_BASE_URL,
-            api_key=settings.OPENROUTER_API_KEY
+        """OpenRouter client on the shared connection pool, with this agent's timeout and retries"""
+        return openrouter_client(timeout=self.timeout, max_retries=settings.MAX_RETRIES)
+    
+    def _make_api_call(self, messages: list, max_tokens: int = 1000, timeout: Optional[float] = None,
+                       usage: Optional[Dict[str, int]] = None, max_retries: Optional[int] = None) -> str:
+        """Make API call to OpenRouter; token counts are added to usage when given.
+        
+        timeout bounds each attempt; max_retries overrides the client's retry
+        count, e.g. 0 for callers that must finish within a time budget.
+        """
+        try:
+            return self._request_completion(messages, max_tokens, timeout, usage, max_retries)
+        except Exception as e:
+            print(f"API call failed: {e}")
+            return None
+    
+    def _request_completion(self, messages: list, max_tokens: int = 1000, timeout: Optional[float] = None,
+                            usage: Optional[Dict[str, int]] = None, max_retries: Optional[int] = None) -> str:
+        """_make_api_call without the error handling: failures are raised as the SDK's exceptions"""
+        request = self._completion_request(messages, max_tokens)
+        cache_key, cached = self._cache_lookup(request, usage)
+        if cached is not None:
+            return cached
+        
+        client = self.client if max_retries is None else self.client.with_options(max_retries=max_retries)
+        response = client.chat.completions.create(
+            **request,
+            **({'timeout': timeout} if timeout is not None else {})
         )
+        return self._finish_completion(response, cache_key, usage)
     
-    def _make_api_call(self, messages: list, max_tokens: int = 1000) -> str:
-        """Make API call to OpenRouter"""
+    async def _amake_api_call(self, messages: list, max_tokens: int = 1000, timeout: Optional[float] = None,
+                              usage: Optional[Dict[str, int]] = None) -> str:
+        """Async _make_api_call on the event loop's shared AsyncOpenAI client.
+        
+        Cancellation (e.g. a request deadline) is not swallowed: it aborts
+        the HTTP request and propagates to the caller.
+        """
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=max_tokens
+            request = self._completion_request(messages, max_tokens)
+            cache_key, cached = self._cache_lookup(request, usage)
+            if cached is not None:
+                return cached
+            
+            client = async_openrouter_client(timeout=self.timeout, max_retries=settings.MAX_RETRIES)
+            response = await client.chat.completions.create(
+                **request,
+                **({'timeout': timeout} if timeout is not None else {})
             )
-            return response.choices[0].message.content
+            return self._finish_completion(response, cache_key, usage)
         except Exception as e:
             print(f"API call failed: {e}")
             return None
     
+    def _stream_api_call(self, messages: list, max_tokens: int = 1000, timeout: Optional[float] = None,
+                         usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+        """Stream a completion from OpenRouter, yielding text as it arrives.
+        
+        Unlike _make_api_call, failures are raised so the caller can tell a
+        broken stream from an empty answer.
+        """
+        request = self._completion_request(messages, max_tokens)
+        cache_key, cached = self._cache_lookup(request, usage)
+        if cached is not None:
+            yield cached
+            return
+        
+        stream = self.client.chat.completions.create(
+            **request,
+            stream=True,
+            stream_options={'include_usage': True},
+            **({'timeout': timeout} if timeout is not None else {})
+        )
+        parts = []
+        reported = None
+        for chunk in stream:
+            if getattr(chunk, 'usage', None) is not None:
+                reported = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        
+        if usage is not None:
+            self._record_usage(usage, reported)
+        if cache_key is not None:
+            self.cache.put(cache_key, {'content': ''.join(parts)})
+    
+    def _completion_request(self, messages: list, max_tokens: int) -> Dict[str, Any]:
+        """The request fields that determine a completion, and so its cache key"""
+        return {
+            'model': self.model_name,
+            'messages': messages,
+            'temperature': self.temperature,
+            'max_tokens': max_tokens
+        }
+    
+    def _cache_lookup(self, request: Dict[str, Any], usage: Optional[Dict[str, int]]):
+        """Returns the request's cache key (None when not cacheable) and the cached content, if any"""
+        if not self._cacheable():
+            return None, None
+        cache_key = request_key(request)
+        cached = self.cache.get(cache_key)
+        self._count_cache_lookup(cached is not None)
+        if cached is None:
+            return cache_key, None
+        if usage is not None:
+            usage['cached_calls'] = usage.get('cached_calls', 0) + 1
+        return cache_key, cached['content']
+    
+    def _finish_completion(self, response, cache_key: Optional[str], usage: Optional[Dict[str, int]]) -> str:
+        if usage is not None:
+            self._record_usage(usage, response.usage)
+        content = response.choices[0].message.content
+        if cache_key is not None and content is not None:
+            self.cache.put(cache_key, {'content': content})
+        return content
+    
+    def _cacheable(self) -> bool:
+        return self.cache is not None and (self.temperature == 0 or self.cache_nondeterministic)
+    
+    def _count_cache_lookup(self, hit: bool):
+        with self._cache_counts_lock:
+            self._cache_counts['hits' if hit else 'misses'] += 1
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """This agent's LLM cache hits and misses, plus the shared cache's own counters"""
+        with self._cache_counts_lock:
+            hits, misses = self._cache_counts['hits'], self._cache_counts['misses']
+        return {
+            'enabled': self._cacheable(),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'cache': self.cache.stats() if self.cache is not None else {}
+        }
+    
+    def _record_usage(self, usage: Dict[str, int], reported):
+        """Accumulate the token counts reported for one completion"""
+        usage['calls'] = usage.get('calls', 0) + 1
+        usage['prompt_tokens'] = usage.get('prompt_tokens', 0) + (getattr(reported, 'prompt_tokens', 0) or 0)
+        usage['completion_tokens'] = usage.get('completion_tokens', 0) + (getattr(reported, 'completion_tokens', 0) or 0)
+    
     @abstractmethod
     def process(self, input_data: Any) -> Dict[str, Any]:
         """Process input and return results"""
@@ -1,13 +1,34 @@
 from agents.base_agent import BaseAgent
-from typing import Dict, Any
+from typing import Dict, Any, Iterator
 from config.settings import settings
 
 class GeneratorAgent(BaseAgent):
     def __init__(self, model_name: str = None):
-        super().__init__(model_name or settings.PRIMARY_MODEL)
+        super().__init__(model_name or settings.PRIMARY_MODEL, timeout=settings.GENERATOR_TIMEOUT)
     
     def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Generate response based on input data"""
+        response = self._make_api_call(self._build_messages(input_data), max_tokens=1500)
+        
+        return {
+            'response': response,
+            'confidence': self.get_confidence_score(response)
+        }
+    
+    async def aprocess(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Async process on the shared AsyncOpenAI client"""
+        response = await self._amake_api_call(self._build_messages(input_data), max_tokens=1500)
+        
+        return {
+            'response': response,
+            'confidence': self.get_confidence_score(response)
+        }
+    
+    def stream(self, input_data: Dict[str, Any]) -> Iterator[str]:
+        """Generate the same response as process, yielding text as it is produced"""
+        return self._stream_api_call(self._build_messages(input_data), max_tokens=1500)
+    
+    def _build_messages(self, input_data: Dict[str, Any]) -> list:
         context = input_data.get('context', [])
         query = input_data.get('query', '')
         multimodal_context = input_data.get('multimodal_context', {})
@@ -39,10 +60,4 @@ class GeneratorAgent(BaseAgent):
         Answer:
         """
         
-        messages = [{"role": "user", "content": prompt}]
-        response = self._make_api_call(messages, max_tokens=1500)
-        
-        return {
-            'response': response,
-            'confidence': self.get_confidence_score(response)
-        }
+        return [{"role": "user", "content": prompt}]
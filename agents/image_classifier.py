@@ -1,10 +1,28 @@
 from agents.base_agent import BaseAgent
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List
 import json
+import os
+from config.settings import settings
+from utils.image_hash_cache import ImageAnalysisCache, dhash_base64
+from utils.rate_limiter import TokenBucket
 
 class ImageClassifierAgent(BaseAgent):
     def __init__(self):
-        super().__init__(model_name="anthropic/claude-3-sonnet")
+        super().__init__(model_name="anthropic/claude-3-sonnet", timeout=settings.IMAGE_ANALYSIS_TIMEOUT)
+        self.max_workers = settings.IMAGE_ANALYSIS_MAX_WORKERS
+        # Shared by all workers so the whole agent stays under the provider limit
+        self.rate_limiter = TokenBucket(
+            settings.IMAGE_ANALYSIS_REQUESTS_PER_SECOND,
+            settings.IMAGE_ANALYSIS_BURST
+        )
+        self.analysis_cache = None
+        if settings.IMAGE_CACHE_ENABLED:
+            self.analysis_cache = ImageAnalysisCache(
+                self.model_name,
+                path=os.path.join(os.path.dirname(os.path.abspath(settings.VECTOR_DB_PATH)), "image_analysis_cache.sqlite"),
+                max_distance=settings.IMAGE_CACHE_MAX_DISTANCE
+            )
     
     def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Classify and analyze images in documents"""
@@ -18,17 +36,12 @@ class ImageClassifierAgent(BaseAgent):
                 'routing_decision': 'text_only'
             }
         
-        analysis_results = []
-        for image in images:
-            if image.get('base64'):
-                analysis = self._analyze_image_content(image, document_context)
-                analysis_results.append(analysis)
-            else:
-                analysis_results.append({
-                    'type': 'unprocessable',
-                    'importance': 'unknown',
-                    'recommendation': 'flag_for_human_review'
-                })
+        # Analyze concurrently; map() keeps results in the original image order
+        workers = max(1, min(self.max_workers, len(images)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-analysis") as executor:
+            analysis_results = list(executor.map(
+                lambda image: self._analyze_image(image, document_context), images
+            ))
         
         # Determine routing decision
         routing_decision = self._determine_routing(analysis_results)
@@ -43,7 +56,56 @@ class ImageClassifierAgent(BaseAgent):
             )
         }
     
-    def _analyze_image_content(self, image: Dict[str, Any], context: str) -> Dict[str, Any]:
+    def _analyze_image(self, image: Dict[str, Any], context: str) -> Dict[str, Any]:
+        """Analyze one image, never raising so a failure does not affect the others.
+        
+        A LazyImage's encoded payload is released once the image is
+        classified, so a document's images are not all held in memory.
+        """
+        try:
+            return self._classify_image(image, context)
+        finally:
+            release = getattr(image, 'release', None)
+            if release is not None:
+                release()
+    
+    def _classify_image(self, image: Dict[str, Any], context: str) -> Dict[str, Any]:
+        if not image.get('base64'):
+            return {
+                'type': 'unprocessable',
+                'importance': 'unknown',
+                'recommendation': 'flag_for_human_review'
+            }
+        
+        try:
+            # Near-duplicate images (logos, repeated figures) reuse an earlier analysis
+            image_hash = None
+            if self.analysis_cache is not None:
+                image_hash = image.get('dhash')
+                if image_hash is None:
+                    image_hash = dhash_base64(image['base64'])
+                if image_hash is not None:
+                    cached = self.analysis_cache.get(image_hash)
+                    if cached is not None:
+                        return cached
+            
+            self.rate_limiter.acquire()
+            return self._analyze_image_content(image, context, image_hash=image_hash)
+        except Exception as e:
+            print(f"Image analysis failed: {e}")
+            return self._analysis_fallback()
+    
+    def _analysis_fallback(self) -> Dict[str, Any]:
+        return {
+            'type': 'unknown',
+            'importance': 'moderate',
+            'contains_essential_info': True,
+            'recommendation': 'flag_uncertainty',
+            'description': 'Could not analyze image',
+            'confidence': 0.1
+        }
+    
+    def _analyze_image_content(self, image: Dict[str, Any], context: str, image_hash: int = None) -> Dict[str, Any]:
         """Analyze individual image content"""
         prompt = f"""
         Analyze this image in the context of the document. 
@@ -75,7 +137,7 @@ class ImageClassifierAgent(BaseAgent):
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/jpeg;base64,{image['base64']}"
+                            "url": f"data:{image.get('mime_type', 'image/jpeg')};base64,{image['base64']}"
                         }
                     }
                 ]
@@ -85,16 +147,13 @@ class ImageClassifierAgent(BaseAgent):
         response = self._make_api_call(messages, max_tokens=500)
         
         try:
-            return json.loads(response)
+            analysis = json.loads(response)
         except:
-            return {
-                'type': 'unknown',
-                'importance': 'moderate',
-                'contains_essential_info': True,
-                'recommendation': 'flag_uncertainty',
-                'description': 'Could not analyze image',
-                'confidence': 0.1
-            }
+            return self._analysis_fallback()
+        
+        if image_hash is not None and isinstance(analysis, dict):
+            self.analysis_cache.put(image_hash, analysis)
+        return analysis
     
     def _determine_routing(self, analyses: List[Dict[str, Any]]) -> str:
         """Determine how to route the document based on image analysis"""
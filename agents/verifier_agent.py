@@ -1,22 +1,86 @@
 from agents.base_agent import BaseAgent
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
 from typing import Dict, Any, List
+import asyncio
 import json
+import threading
+import time
+from config.settings import settings
+
+# One verification request: the messages to send and how to turn the reply into a check result
+CheckPlan = namedtuple('CheckPlan', ['messages', 'max_tokens', 'parse'])
 
 class VerifierAgent(BaseAgent):
     def __init__(self):
-        super().__init__(model_name="openai/gpt-4-turbo-preview", temperature=0.0)
+        super().__init__(model_name="openai/gpt-4-turbo-preview", temperature=0.0,
+                         timeout=settings.VERIFICATION_TIMEOUT)
+        self.mode = settings.VERIFICATION_MODE
+        self.check_timeout = settings.VERIFICATION_TIMEOUT
+        # Checks are independent round-trips, so they run side by side
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.VERIFICATION_MAX_WORKERS,
+            thread_name_prefix="verifier"
+        )
     
     def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Verify response quality and detect hallucinations"""
         response = input_data.get('response', '')
         retrieved_context = input_data.get('context', [])
         query = input_data.get('query', '')
+        mode = input_data.get('mode', self.mode)
         
-        # Perform multiple verification checks
-        factual_check = self._check_factual_consistency(response, retrieved_context)
-        context_check = self._check_context_grounding(response, retrieved_context)
-        uncertainty_check = self._check_uncertainty_handling(response, query)
+        if mode == 'consolidated':
+            # One call covering all three checks; context and response are sent once
+            usage = {}
+            factual_check, context_check, uncertainty_check = self._check_all(
+                response, retrieved_context, query, usage
+            )
+        elif mode == 'separate':
+            # Perform multiple verification checks concurrently
+            usages = [{}, {}, {}]
+            factual_check, context_check, uncertainty_check = self._run_checks([
+                (self._check_factual_consistency, self._plan_factual_consistency(response, retrieved_context), usages[0]),
+                (self._check_context_grounding, self._plan_context_grounding(response, retrieved_context), usages[1]),
+                (self._check_uncertainty_handling, self._plan_uncertainty_handling(response, query), usages[2])
+            ])
+            usage = self._merge_usage(usages)
+        else:
+            raise ValueError(f"Unknown verification mode: {mode}")
         
+        return self._verification_result(mode, factual_check, context_check, uncertainty_check, usage)
+    
+    async def aprocess(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Async process: checks run as concurrent coroutines on the shared AsyncOpenAI client"""
+        response = input_data.get('response', '')
+        retrieved_context = input_data.get('context', [])
+        query = input_data.get('query', '')
+        mode = input_data.get('mode', self.mode)
+        
+        if mode == 'consolidated':
+            usage = {}
+            factual_check, context_check, uncertainty_check = await self._arun_check(
+                self._check_all, self._plan_all(response, retrieved_context, query), usage
+            )
+        elif mode == 'separate':
+            usages = [{}, {}, {}]
+            factual_check, context_check, uncertainty_check = await asyncio.gather(
+                self._arun_check(self._check_factual_consistency,
+                                 self._plan_factual_consistency(response, retrieved_context), usages[0]),
+                self._arun_check(self._check_context_grounding,
+                                 self._plan_context_grounding(response, retrieved_context), usages[1]),
+                self._arun_check(self._check_uncertainty_handling,
+                                 self._plan_uncertainty_handling(response, query), usages[2])
+            )
+            usage = self._merge_usage(usages)
+        else:
+            raise ValueError(f"Unknown verification mode: {mode}")
+        
+        return self._verification_result(mode, factual_check, context_check, uncertainty_check, usage)
+    
+    def _verification_result(self, mode: str, factual_check: Dict[str, Any], context_check: Dict[str, Any],
+                             uncertainty_check: Dict[str, Any], usage: Dict[str, int]) -> Dict[str, Any]:
         overall_confidence = min(
             factual_check['confidence'],
             context_check['confidence'],
@@ -30,11 +94,214 @@ class VerifierAgent(BaseAgent):
             'context_grounding': context_check,
             'uncertainty_handling': uncertainty_check,
             'recommendation': self._get_recommendation(overall_confidence),
-            'flags': self._get_flags(factual_check, context_check, uncertainty_check)
+            'flags': self._get_flags(factual_check, context_check, uncertainty_check),
+            'verification_mode': mode,
+            'token_usage': {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, **usage}
+        }
+    
+    def _merge_usage(self, usages: List[Dict[str, int]]) -> Dict[str, int]:
+        usage = {}
+        for check_usage in usages:
+            for key, value in check_usage.items():
+                usage[key] = usage.get(key, 0) + value
+        return usage
+    
+    def _run_checks(self, checks: List[tuple]) -> List[Dict[str, Any]]:
+        """Run (check, plan, usage) triples in the thread pool, each within check_timeout.
+        
+        A check's budget starts when a worker picks it up, so time spent
+        queued behind other queries' checks does not eat into it. A check
+        past its deadline gets its fallback result; a running check cannot
+        be cancelled, so each of its requests is bounded by the time left
+        (see _evaluate) and its worker is free again by the deadline
+        instead of delaying the next verification.
+        """
+        started = [self._start_check(plan, usage) for _, plan, usage in checks]
+        
+        results = []
+        for (check, _, _), (future, picked_up, deadline) in zip(checks, started):
+            picked_up.wait()
+            try:
+                results.append(future.result(timeout=max(deadline[0] - time.monotonic(), 0.0)))
+            except FutureTimeoutError:
+                print(f"Verification check {check.__name__} timed out")
+                results.append(self._fallback_result(check))
+            except Exception as e:
+                print(f"Verification check {check.__name__} failed: {e}")
+                results.append(self._fallback_result(check))
+        return results
+    
+    def _start_check(self, plan, usage: Dict[str, int]):
+        """Queue one check; returns its future, an event set on pickup and the deadline it then gets"""
+        picked_up = threading.Event()
+        deadline = []
+        
+        def run():
+            deadline.append(time.monotonic() + self.check_timeout)
+            picked_up.set()
+            return self._evaluate(plan, usage, deadline[0])
+        
+        return self._executor.submit(run), picked_up, deadline
+    
+    async def _arun_check(self, check, plan, usage: Dict[str, int]):
+        """Await one check; past check_timeout or on failure it gets its fallback result"""
+        try:
+            return await asyncio.wait_for(self._aevaluate(plan, usage), timeout=self.check_timeout)
+        except asyncio.TimeoutError:
+            print(f"Verification check {check.__name__} timed out")
+        except Exception as e:
+            print(f"Verification check {check.__name__} failed: {e}")
+        if check == self._check_all:
+            return [self._fallback_result(single) for single in
+                    (self._check_factual_consistency, self._check_context_grounding, self._check_uncertainty_handling)]
+        return self._fallback_result(check)
+    
+    def _evaluate(self, plan, usage: Dict[str, int] = None, deadline: float = None):
+        """Run a check plan by deadline (default: check_timeout from now); plans that need no model call are already results"""
+        if not isinstance(plan, CheckPlan):
+            return plan
+        deadline = deadline if deadline is not None else time.monotonic() + self.check_timeout
+        result = None
+        attempts = settings.MAX_RETRIES + 1
+        for attempt in range(attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Retried here rather than by the SDK, whose retries would run past the deadline
+            try:
+                result = self._request_completion(plan.messages, max_tokens=plan.max_tokens, timeout=remaining,
+                                                  usage=usage, max_retries=0)
+                break
+            except Exception as e:
+                print(f"API call failed: {e}")
+                if not self._is_transient(e) or attempt == attempts - 1:
+                    break
+            time.sleep(min(0.5 * 2 ** attempt, max(deadline - time.monotonic(), 0.0)))
+        return plan.parse(result)
+    
+    def _is_transient(self, error: Exception) -> bool:
+        """Errors worth retrying: timeouts, dropped connections, rate limits and server errors"""
+        if isinstance(error, (APITimeoutError, APIConnectionError, RateLimitError)):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code >= 500
+    
+    async def _aevaluate(self, plan, usage: Dict[str, int] = None):
+        if not isinstance(plan, CheckPlan):
+            return plan
+        result = await self._amake_api_call(plan.messages, max_tokens=plan.max_tokens, timeout=self.check_timeout,
+                                            usage=usage)
+        return plan.parse(result)
+    
+    def _fallback_result(self, check) -> Dict[str, Any]:
+        """Conservative result for a check that did not finish"""
+        if check == self._check_factual_consistency:
+            return {
+                "is_consistent": False,
+                "confidence": 0.3,
+                "issues": ["Verification check did not complete"],
+                "unsupported_claims": []
+            }
+        if check == self._check_context_grounding:
+            return {
+                "is_grounded": True,
+                "confidence": 0.5,
+                "coverage": 0.5,
+                "notes": "Verification check did not complete"
+            }
+        return {
+            "handles_uncertainty": True,
+            "confidence": 0.5,
+            "overconfidence_detected": False,
+            "notes": "Verification check did not complete"
         }
     
-    def _check_factual_consistency(self, response: str, context: List[Dict]) -> Dict[str, Any]:
+    def _check_all(self, response: str, context: List[Dict], query: str,
+                   usage: Dict[str, int] = None) -> List[Dict[str, Any]]:
+        """Run factual, grounding and uncertainty checks in a single structured call"""
+        return self._evaluate(self._plan_all(response, context, query), usage)
+    
+    def _plan_all(self, response: str, context: List[Dict], query: str) -> CheckPlan:
+        """Request and result parser for the consolidated check"""
+        context_text = '\n'.join([chunk.get('content', '') for chunk in context])
+        
+        prompt = f"""
+        Verify the response below against the provided context and query.
+        
+        Query: {query}
+        
+        Context:
+        {context_text}
+        
+        Response:
+        {response}
+        
+        Evaluate:
+        1. Factual consistency: claims not supported by the context, contradictions, invented details
+        2. Context grounding: grounding quality, context coverage utilization, gaps between context and response
+        3. Uncertainty handling: acknowledges limitations, avoids overconfident claims, flags incomplete information
+        
+        Respond in JSON:
+        {{
+            "factual_consistency": {{
+                "is_consistent": true|false,
+                "confidence": 0.0-1.0,
+                "issues": ["list of specific issues"],
+                "unsupported_claims": ["list of unsupported claims"]
+            }},
+            "context_grounding": {{
+                "is_grounded": true|false,
+                "confidence": 0.0-1.0,
+                "coverage": 0.0-1.0,
+                "notes": "explanation"
+            }},
+            "uncertainty_handling": {{
+                "handles_uncertainty": true|false,
+                "confidence": 0.0-1.0,
+                "overconfidence_detected": true|false,
+                "notes": "explanation"
+            }}
+        }}
+        """
+        
+        messages = [{"role": "user", "content": prompt}]
+        
+        def parse(result):
+            try:
+                parsed = json.loads(result)
+            except:
+                parsed = {}
+        
+            checks = [
+                ('factual_consistency', self._check_factual_consistency),
+                ('context_grounding', self._check_context_grounding),
+                ('uncertainty_handling', self._check_uncertainty_handling)
+            ]
+            results = []
+            for key, check in checks:
+                section = parsed.get(key) if isinstance(parsed, dict) else None
+                if isinstance(section, dict) and 'confidence' in section:
+                    results.append(section)
+                else:
+                    results.append(self._fallback_result(check))
+        
+            if not context:
+                results[1] = {
+                    "is_grounded": False,
+                    "confidence": 0.0,
+                    "coverage": 0.0,
+                    "notes": "No context provided"
+                }
+            return results
+        
+        return CheckPlan(messages, 1200, parse)
+    
+    def _check_factual_consistency(self, response: str, context: List[Dict],
+                                   usage: Dict[str, int] = None) -> Dict[str, Any]:
         """Check if response is factually consistent with context"""
+        return self._evaluate(self._plan_factual_consistency(response, context), usage)
+    
+    def _plan_factual_consistency(self, response: str, context: List[Dict]) -> CheckPlan:
+        """Request and result parser for the factual consistency check"""
         context_text = '\n'.join([chunk.get('content', '') for chunk in context])
         
         prompt = f"""
@@ -61,20 +328,27 @@ class VerifierAgent(BaseAgent):
         """
         
         messages = [{"role": "user", "content": prompt}]
-        result = self._make_api_call(messages, max_tokens=800)
         
-        try:
-            return json.loads(result)
-        except:
-            return {
-                "is_consistent": False,
-                "confidence": 0.3,
-                "issues": ["Could not parse verification result"],
-                "unsupported_claims": []
-            }
+        def parse(result):
+            try:
+                return json.loads(result)
+            except:
+                return {
+                    "is_consistent": False,
+                    "confidence": 0.3,
+                    "issues": ["Could not parse verification result"],
+                    "unsupported_claims": []
+                }
+        
+        return CheckPlan(messages, 800, parse)
     
-    def _check_context_grounding(self, response: str, context: List[Dict]) -> Dict[str, Any]:
+    def _check_context_grounding(self, response: str, context: List[Dict],
+                                 usage: Dict[str, int] = None) -> Dict[str, Any]:
         """Check if response is properly grounded in context"""
+        return self._evaluate(self._plan_context_grounding(response, context), usage)
+    
+    def _plan_context_grounding(self, response: str, context: List[Dict]):
+        """Request and result parser for the grounding check (or its result when there is no context)"""
         if not context:
             return {
                 "is_grounded": False,
@@ -109,20 +383,27 @@ class VerifierAgent(BaseAgent):
         """
         
         messages = [{"role": "user", "content": prompt}]
-        result = self._make_api_call(messages, max_tokens=600)
         
-        try:
-            return json.loads(result)
-        except:
-            return {
-                "is_grounded": True,
-                "confidence": 0.5,
-                "coverage": 0.5,
-                "notes": "Could not evaluate grounding"
-            }
+        def parse(result):
+            try:
+                return json.loads(result)
+            except:
+                return {
+                    "is_grounded": True,
+                    "confidence": 0.5,
+                    "coverage": 0.5,
+                    "notes": "Could not evaluate grounding"
+                }
+        
+        return CheckPlan(messages, 600, parse)
     
-    def _check_uncertainty_handling(self, response: str, query: str) -> Dict[str, Any]:
+    def _check_uncertainty_handling(self, response: str, query: str,
+                                    usage: Dict[str, int] = None) -> Dict[str, Any]:
         """Check if response appropriately handles uncertainty"""
+        return self._evaluate(self._plan_uncertainty_handling(response, query), usage)
+    
+    def _plan_uncertainty_handling(self, response: str, query: str) -> CheckPlan:
+        """Request and result parser for the uncertainty check"""
         prompt = f"""
         Evaluate how well the response handles uncertainty and knowledge gaps.
         
@@ -144,17 +425,19 @@ class VerifierAgent(BaseAgent):
         """
         
         messages = [{"role": "user", "content": prompt}]
-        result = self._make_api_call(messages, max_tokens=500)
         
-        try:
-            return json.loads(result)
-        except:
-            return {
-                "handles_uncertainty": True,
-                "confidence": 0.5,
-                "overconfidence_detected": False,
-                "notes": "Could not evaluate uncertainty handling"
-            }
+        def parse(result):
+            try:
+                return json.loads(result)
+            except:
+                return {
+                    "handles_uncertainty": True,
+                    "confidence": 0.5,
+                    "overconfidence_detected": False,
+                    "notes": "Could not evaluate uncertainty handling"
+                }
+        
+        return CheckPlan(messages, 500, parse)
     
     def _get_recommendation(self, confidence: float) -> str:
         """Get recommendation based on confidence score"""
@@ -17,11 +17,90 @@ class Settings(BaseSettings):
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     CHUNK_SIZE: int = 512
     CHUNK_OVERLAP: int = 50
+
+    # Vector Store Persistence
+    AUTO_COMPACT: bool = True
+    SEGMENT_MERGE_FACTOR: int = 10  # Adjacent segments of similar size merged into one at a time
+    TOMBSTONE_COMPACTION_RATIO: float = 0.2  # Rewrite a segment once this share of its chunks is deleted
+
+    # ANN Index Configuration
+    INDEX_TYPE: str = "flat"  # flat | hnsw | ivfpq
+    INDEX_METRIC: str = "cosine"  # cosine (normalized inner product) | l2
+    MIN_RELEVANCE_SCORE: float = 0.2  # Retrieved chunks scoring below this are not sent to the LLM
+    FILTER_BRUTE_FORCE_MAX: int = 50000  # Filtered subsets up to this size are searched exactly
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64
+    IVF_NLIST: int = 1024
+    IVF_NPROBE: int = 16
+    PQ_M: int = 48  # Sub-quantizers; must divide the embedding dimension
+    PQ_NBITS: int = 8
+    INDEX_TRAIN_MIN_VECTORS: int = 0  # Extra floor on top of FAISS' own training minimum
+    INDEX_TRAIN_SAMPLE_SIZE: int = 100000
+
+    # Embedding Engine
+    EMBEDDING_BATCH_SIZE: int = 32
+    EMBEDDING_PROCESSES: int = 0  # >1 starts a sentence-transformers multi-process pool
+    EMBEDDING_POOL_MIN_TEXTS: int = 256  # Smaller inputs are encoded in-process
     
+    # Embedding Cache (on-disk tier lives next to VECTOR_DB_PATH)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = 10000
+
+    # Response Cache (paraphrased questions over the same retrieved chunks)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_SIMILARITY: float = 0.95  # Minimum cosine similarity between questions
+    RESPONSE_CACHE_TTL: float = 3600.0  # Seconds
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+
+    # LLM Call Cache (exact request match; on-disk tier lives next to VECTOR_DB_PATH)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_NONDETERMINISTIC: bool = False  # Also cache calls made with temperature > 0
+    LLM_CACHE_MEMORY_ITEMS: int = 1000
+    LLM_CACHE_DISK_ITEMS: int = 50000
+
     # Agent Configuration
-    MAX_RETRIES: int = 3
+    MAX_RETRIES: int = 3  # Retries per LLM request, with exponential backoff
+    QUERY_TIMEOUT: float = 90.0  # Deadline for a whole async query (aquery)
+    QUERY_CPU_WORKERS: int = 4  # Threads for embedding and search in async queries
+    GENERATOR_TIMEOUT: float = 120.0  # Seconds per answer generation request
+    IMAGE_ANALYSIS_TIMEOUT: float = 90.0  # Seconds per image analysis request
     CONFIDENCE_THRESHOLD: float = 0.7
     HALLUCINATION_THRESHOLD: float = 0.6
+    VERIFICATION_MODE: str = "separate"  # separate (three calls) | consolidated (one call)
+    VERIFICATION_TIMEOUT: float = 30.0  # Seconds per verification check
+    VERIFICATION_MAX_WORKERS: int = 3
+    
+    # HTTP Connection Pool (shared by all agents)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0  # Seconds an idle connection stays open
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_READ_TIMEOUT: float = 120.0  # Default for callers without their own timeout
+    HTTP2_ENABLED: bool = True  # Used when the h2 package is installed
+    
+    # Document Parsing
+    PDF_EXTRACTION_WORKERS: int = 0  # Processes for PDF text extraction; 0 uses all cores, 1 disables
+    PDF_PARALLEL_MIN_PAGES: int = 32  # Smaller PDFs are extracted in-process
+    
+    # Ingestion Pipeline
+    INGEST_BATCH_SIZE: int = 64  # Chunks per embedding / index batch (at least EMBEDDING_POOL_MIN_TEXTS with the pool)
+    INGEST_MAX_PENDING_BATCHES: int = 2  # Queue depth between pipeline stages
+    BULK_INGEST_WORKERS: int = 0  # Parser processes for bulk ingest; 0 uses all cores
+    BULK_INGEST_CHECKPOINT: str = "./data/ingest_checkpoint.jsonl"
+    
+    # Image Preprocessing (applied before base64 upload)
+    IMAGE_MAX_SIDE: int = 1568  # Longest side in pixels after downscaling
+    IMAGE_JPEG_QUALITY: int = 85
+    IMAGE_MIN_SIDE: int = 64  # Embedded images below these sizes are treated as decorative
+    IMAGE_MIN_PIXELS: int = 16384
+    
+    # Image Analysis Concurrency
+    IMAGE_ANALYSIS_MAX_WORKERS: int = 4
+    IMAGE_ANALYSIS_REQUESTS_PER_SECOND: float = 2.0  # Token bucket refill rate; 0 disables limiting
+    IMAGE_ANALYSIS_BURST: int = 4
+    IMAGE_CACHE_ENABLED: bool = True  # Perceptual-hash cache next to VECTOR_DB_PATH
+    IMAGE_CACHE_MAX_DISTANCE: int = 4  # Hamming bits (of 64) still treated as the same image
     
     # Streamlit Configuration
     UPLOAD_DIR: str = "./data/uploads"
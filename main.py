@@ -48,10 +48,14 @@ def main():
         )
         
         if uploaded_files:
+            replace_existing = st.checkbox(
+                "Replace earlier uploads with the same file name",
+                help="Otherwise a file whose name is already indexed is added alongside the earlier one"
+            )
             process_button = st.button("🔄 Process Documents", type="primary")
             
             if process_button:
-                process_documents(uploaded_files)
+                process_documents(uploaded_files, replace_existing)
         
         # Display processed documents
         if st.session_state.processed_documents:
@@ -64,10 +68,18 @@ def main():
                         'Has Images': doc['has_images'],
                         'Status': '✅ Processed'
                     })
+                    if st.button("🗑️ Remove", key=f"remove_{doc['document_id']}"):
+                        remove_document(doc['document_id'])
+                        st.rerun()
         
         # Settings
         with st.expander("⚙️ Settings"):
             retrieval_k = st.slider("Retrieval Results", 3, 10, 5)
+            scoped_documents = st.multiselect(
+                "Search Only In",
+                options=st.session_state.processed_documents,
+                format_func=lambda doc: doc['filename']
+            )
             confidence_threshold = st.slider("Confidence Threshold", 0.0, 1.0, 0.7)
     
     # Main chat interface
@@ -84,7 +96,8 @@ def main():
         )
         
         if user_question and st.button("🚀 Ask", type="primary"):
-            process_question(user_question, retrieval_k)
+            filters = {'document_id': [doc['document_id'] for doc in scoped_documents]} if scoped_documents else None
+            process_question(user_question, retrieval_k, filters)
         
         # Display chat history
         if st.session_state.chat_history:
@@ -163,7 +176,17 @@ def main():
             - 📊 Confidence scoring
             """)
 
-def process_documents(uploaded_files):
+def remove_document(document_id: str):
+    """Delete a document from the index and the processed list"""
+    result = st.session_state.orchestrator.delete_document(document_id)
+    if result['success']:
+        st.session_state.processed_documents = [
+            doc for doc in st.session_state.processed_documents if doc['document_id'] != document_id
+        ]
+    else:
+        st.error(f"❌ Failed to remove document: {result.get('error')}")
+
+def process_documents(uploaded_files, replace_existing=False):
     """Process uploaded documents"""
     progress_bar = st.progress(0)
     status_text = st.empty()
@@ -178,9 +201,13 @@ def process_documents(uploaded_files):
         
         try:
             # Process document
-            result = st.session_state.orchestrator.process_document(tmp_file_path)
+            result = st.session_state.orchestrator.process_document(
+                tmp_file_path, source_name=uploaded_file.name, replace_existing=replace_existing
+            )
             
-            if result['success']:
+            if result['success'] and result.get('duplicate'):
+                st.info(f"ℹ️ {uploaded_file.name} is already indexed; skipped")
+            elif result['success']:
                 # Add to processed documents list
                 doc_info = {
                     'filename': uploaded_file.name,
@@ -190,9 +217,15 @@ def process_documents(uploaded_files):
                     'has_images': result['has_images'],
                     'metadata': result.get('metadata', {})
                 }
+                st.session_state.processed_documents = [
+                    doc for doc in st.session_state.processed_documents
+                    if doc['document_id'] != result.get('replaced_document_id')
+                ]
                 st.session_state.processed_documents.append(doc_info)
                 
                 st.success(f"✅ Successfully processed {uploaded_file.name}")
+                if result.get('replaced_document_id'):
+                    st.info(f"♻️ Replaced the previously indexed {uploaded_file.name}")
                 
                 # Show image analysis if available
                 if result.get('image_analysis') and result['image_analysis'].get('has_images'):
@@ -212,41 +245,59 @@ def process_documents(uploaded_files):
     
     status_text.text("✅ All documents processed!")
 
-def process_question(question, k):
+def process_question(question, k, filters=None):
     """Process user question"""
-    with st.spinner("🤔 Thinking..."):
-        result = st.session_state.orchestrator.query(question, k=k)
+    # Show the answer as it is generated; verification annotates it afterwards
+    answer_placeholder = st.empty()
+    status_placeholder = st.empty()
+    status_placeholder.caption("🤔 Thinking...")
+    streamed = ""
+    result = None
+    for event in st.session_state.orchestrator.query_stream(question, k=k, filters=filters):
+        if event['type'] == 'token':
+            streamed += event['text']
+            answer_placeholder.markdown(streamed + "▌")
+            status_placeholder.empty()
+        elif event['type'] == 'verifying':
+            answer_placeholder.markdown(streamed)
+            status_placeholder.caption("🔍 Verifying answer...")
+        else:
+            result = event['result']
+    answer_placeholder.empty()
+    status_placeholder.empty()
+    
+    if result['success']:
+        # Add to chat history
+        interaction = {
+            'question': question,
+            'response': result['response'],
+            'confidence': result['confidence'],
+            'verified': result['verified'],
+            'flags': result.get('flags', []),
+            'multimodal_context': result.get('multimodal_context', {}),
+            'sources_used': result.get('sources_used', 0)
+        }
+        st.session_state.chat_history.append(interaction)
         
-        if result['success']:
-            # Add to chat history
-            interaction = {
-                'question': question,
-                'response': result['response'],
-                'confidence': result['confidence'],
-                'verified': result['verified'],
-                'flags': result.get('flags', []),
-                'multimodal_context': result.get('multimodal_context', {}),
-                'sources_used': result.get('sources_used', 0)
-            }
-            st.session_state.chat_history.append(interaction)
-            
-            # Show detailed results
-            if result.get('flags') or result['confidence'] < 0.7:
-                if result['confidence'] < 0.5:
-                    st.error(f"⚠️ Low confidence response: {result['response']}")
-                elif result['confidence'] < 0.7:
-                    st.warning(f"⚠️ Moderate confidence response: {result['response']}")
-                else:
-                    st.info(result['response'])
+        # Show detailed results
+        if result.get('flags') or result['confidence'] < 0.7:
+            if result['confidence'] < 0.5:
+                st.error(f"⚠️ Low confidence response: {result['response']}")
+            elif result['confidence'] < 0.7:
+                st.warning(f"⚠️ Moderate confidence response: {result['response']}")
             else:
-                st.success(result['response'])
-            
-            # Show verification details in expander
-            if result.get('verification_details'):
-                with st.expander("🔍 Verification Details"):
-                    st.json(result['verification_details'])
+                st.info(result['response'])
         else:
-            st.error(f"❌ Error: {result.get('error', 'Unknown error occurred')}")
+            st.success(result['response'])
+        if result.get('cached'):
+            st.caption("⚡ Reused the answer to a near-identical earlier question")
+        
+        # Show verification details in expander
+        if result.get('verification_details'):
+            with st.expander("🔍 Verification Details"):
+                st.json(result['verification_details'])
+    else:
+        st.error(f"❌ Error: {result.get('error', 'Unknown error occurred')}")
 
 if __name__ == "__main__":
     # Create necessary directories
@@ -0,0 +1,200 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, Optional, Tuple
+from config.settings import settings
+from utils.document_processor import DocumentProcessor
+
+_processor = None
+
+
+def _init_worker():
+    """Per-process setup: one DocumentProcessor, and no nested PDF process pools"""
+    global _processor
+    settings.PDF_EXTRACTION_WORKERS = 1
+    _processor = DocumentProcessor()
+
+
+def _parse_file(path: str, include_images: bool) -> Dict[str, Any]:
+    """Parse one file in a worker; returns plain, picklable document data"""
+    doc_data = _processor.process_document(path)
+    images = []
+    for image in doc_data.get('images', []):
+        if include_images:
+            # Force lazy handles to encode here so the parent only sends them on
+            image.get('base64')
+        images.append(dict(image))
+    doc_data['images'] = images
+    return doc_data
+
+
+class Checkpoint:
+    """Append-only JSON lines log of per-file outcomes, used to resume interrupted runs"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from an interrupted write
+                    self.entries[entry['path']] = entry
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        # Start new entries on a fresh line after a torn one
+        if self._file.tell() and not self._ends_with_newline(path):
+            self._file.write('\n')
+
+    @staticmethod
+    def _ends_with_newline(path: str) -> bool:
+        with open(path, 'rb') as file:
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b'\n'
+
+    def is_done(self, path: str, stat: os.stat_result, retry_failed: bool = False) -> bool:
+        entry = self.entries.get(path)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            return False
+        return not (retry_failed and entry['status'] == 'failed')
+
+    def record(self, path: str, stat: os.stat_result, status: str, **details):
+        entry = {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'status': status, **details}
+        self.entries[path] = entry
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class BulkIngestor:
+    """Headless ingestion of a directory tree.
+
+    Files are parsed in a pool of worker processes; the parent process owns
+    the only index writer and feeds parsed documents through the regular
+    orchestrator pipeline one at a time. Every outcome is appended to a
+    checkpoint so an interrupted run skips finished files when restarted.
+    """
+
+    def __init__(self, orchestrator, checkpoint_path: str, workers: int = None,
+                 analyze_images: bool = False, retry_failed: bool = False):
+        self.orchestrator = orchestrator
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.analyze_images = analyze_images
+        self.retry_failed = retry_failed
+        self.supported_extensions = set(orchestrator.document_processor.supported_formats)
+        self.counts = {'indexed': 0, 'duplicate': 0, 'failed': 0, 'skipped': 0}
+
+    def discover(self, root: str) -> Iterator[Tuple[str, os.stat_result]]:
+        """Supported files under root, in a stable order"""
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in self.supported_extensions:
+                    path = os.path.abspath(os.path.join(directory, name))
+                    yield path, os.stat(path)
+
+    def run(self, root: str) -> Dict[str, int]:
+        root = os.path.abspath(root)
+        pending = {}
+        started = time.monotonic()
+        # Spawned workers do not inherit the parent's embedding model or torch threads
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                 initializer=_init_worker) as executor:
+            try:
+                for path, stat in self.discover(root):
+                    if self.checkpoint.is_done(path, stat, self.retry_failed):
+                        self.counts['skipped'] += 1
+                        continue
+
+                    document_id = self.orchestrator.document_processor.content_hash(path)
+                    in_flight = any(pending_id == document_id for _, _, pending_id in pending.values())
+                    if in_flight or self.orchestrator.is_indexed(document_id):
+                        self._finish(path, stat, 'duplicate', document_id=document_id)
+                        continue
+
+                    future = executor.submit(_parse_file, path, self.analyze_images)
+                    pending[future] = (path, stat, document_id)
+                    # Index whatever has been parsed; wait once the window is full so
+                    # parsed-but-unindexed documents held in memory stay bounded
+                    self._index_completed(pending, root, block=len(pending) >= self.workers * 2)
+
+                while pending:
+                    self._index_completed(pending, root, block=True)
+            except KeyboardInterrupt:
+                for future in pending:
+                    future.cancel()
+                print("Interrupted; progress is saved in the checkpoint")
+                raise
+            finally:
+                self.checkpoint.close()
+
+        elapsed = time.monotonic() - started
+        print(f"Done in {elapsed:.1f}s: " + ", ".join(f"{key} {value}" for key, value in self.counts.items()))
+        return self.counts
+
+    def _index_completed(self, pending: Dict, root: str, block: bool):
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED, timeout=None if block else 0)
+        for future in done:
+            path, stat, document_id = pending.pop(future)
+            try:
+                doc_data = future.result()
+            except Exception as e:
+                self._finish(path, stat, 'failed', document_id=document_id, error=str(e))
+                continue
+
+            # The path under root names the file, so a changed file replaces its earlier version
+            result = self.orchestrator.index_document(
+                doc_data, document_id, os.path.relpath(path, root), analyze_images=self.analyze_images,
+                replace_existing=True
+            )
+            if not result['success']:
+                self._finish(path, stat, 'failed', document_id=document_id, error=result.get('error'))
+            elif doc_data.get('error'):
+                self._finish(path, stat, 'failed', document_id=document_id, error=doc_data['error'],
+                             chunks=result['chunks_created'])
+            else:
+                self._finish(path, stat, 'indexed', document_id=document_id, chunks=result['chunks_created'])
+
+    def _finish(self, path: str, stat: os.stat_result, status: str, **details):
+        self.checkpoint.record(path, stat, status, **details)
+        self.counts[status] += 1
+        suffix = f" ({details['error']})" if details.get('error') else ''
+        print(f"[{status}] {path}{suffix}")
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Index every supported document under a directory")
+    parser.add_argument('root', help="Directory to walk")
+    parser.add_argument('--workers', type=int, default=settings.BULK_INGEST_WORKERS or None,
+                        help="Parser processes (default: all cores)")
+    parser.add_argument('--checkpoint', default=settings.BULK_INGEST_CHECKPOINT,
+                        help="Progress log used to resume interrupted runs")
+    parser.add_argument('--analyze-images', action='store_true',
+                        help="Send embedded images to the vision model (slow, billed per image)")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Process files that failed in an earlier run again")
+    args = parser.parse_args(argv)
+
+    from orchestrator.rag_orchestrator import RAGOrchestrator
+    ingestor = BulkIngestor(
+        RAGOrchestrator(),
+        args.checkpoint,
+        workers=args.workers,
+        analyze_images=args.analyze_images,
+        retry_failed=args.retry_failed
+    )
+    ingestor.run(args.root)
+
+
+if __name__ == '__main__':
+    main()
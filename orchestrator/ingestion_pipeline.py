@@ -0,0 +1,107 @@
+import queue
+import threading
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def batched(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class IngestionPipeline:
+    """Overlaps parsing/chunking, embedding and indexing of one document.
+    
+    Three stages connected by bounded queues:
+    
+        chunk iterator --(batches)--> encoder --(batches + vectors)--> writer
+    
+    The chunk iterator (which drives the lazy parser) runs in its own
+    thread, embedding in another, and the writer in the calling thread.
+    Full queues block the upstream stage, so at most max_pending batches
+    wait between stages and memory stays bounded by the batch size rather
+    than the document size.
+    """
+    
+    def __init__(self, batch_size: int = 64, max_pending: int = 2):
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+    
+    def run(self, chunks: Iterable[Dict[str, Any]], writer) -> int:
+        """Stream chunks through writer.encode / writer.write; returns the number written"""
+        stop = threading.Event()
+        encode_queue = queue.Queue(maxsize=self.max_pending)
+        write_queue = queue.Queue(maxsize=self.max_pending)
+        
+        def put(target: queue.Queue, item) -> bool:
+            # Blocking put that gives up once the pipeline is being torn down
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce():
+            try:
+                for batch in batched(chunks, self.batch_size):
+                    if not put(encode_queue, batch):
+                        return
+                put(encode_queue, _DONE)
+            except BaseException as e:
+                put(encode_queue, _Failure(e))
+        
+        def encode():
+            while True:
+                item = encode_queue.get()
+                if item is _DONE or isinstance(item, _Failure):
+                    put(write_queue, item)
+                    return
+                try:
+                    embeddings = writer.encode(item)
+                except BaseException as e:
+                    put(write_queue, _Failure(e))
+                    return
+                if not put(write_queue, (item, embeddings)):
+                    return
+        
+        threads = [
+            threading.Thread(target=produce, name="ingest-parse", daemon=True),
+            threading.Thread(target=encode, name="ingest-embed", daemon=True)
+        ]
+        for thread in threads:
+            thread.start()
+        
+        written = 0
+        try:
+            while True:
+                item = write_queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+                batch, embeddings = item
+                writer.write(batch, embeddings)
+                written += len(batch)
+        finally:
+            stop.set()
+            # Unblock the encoder if it is waiting on an empty queue
+            try:
+                encode_queue.put_nowait(_DONE)
+            except queue.Full:
+                pass
+            for thread in threads:
+                thread.join()
+        return written
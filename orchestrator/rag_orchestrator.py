@@ -1,10 +1,17 @@
-from typing import Dict, Any, List
-import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+import asyncio
+import itertools
+import os
+import numpy as np
 from agents.image_classifier import ImageClassifierAgent
 from agents.verifier_agent import VerifierAgent
 from agents.base_agent import BaseAgent
 from utils.document_processor import DocumentProcessor
 from utils.vector_store import VectorStore
+from utils.response_cache import ResponseCache
+from utils.text_chunker import TextChunker
+from orchestrator.ingestion_pipeline import IngestionPipeline
 from config.settings import settings
 from agents.generator_agent import GeneratorAgent  # Import the new generator
 
@@ -13,36 +20,125 @@ class RAGOrchestrator:
     def __init__(self):
         self.document_processor = DocumentProcessor()
         self.vector_store = VectorStore()
+        self.chunker = TextChunker.for_model(self.vector_store.embedding_model)
         self.image_classifier = ImageClassifierAgent()
         self.verifier = VerifierAgent()
         self.generator = GeneratorAgent()  # Use concrete implementation
+        self.ingestion_pipeline = IngestionPipeline(
+            batch_size=self._ingest_batch_size(),
+            max_pending=settings.INGEST_MAX_PENDING_BATCHES
+        )
+        self._image_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-images")
+        # Bounded pool for the CPU-bound stages of async queries (embedding, search)
+        self._query_executor = ThreadPoolExecutor(max_workers=settings.QUERY_CPU_WORKERS,
+                                                  thread_name_prefix="query-cpu")
+        self.response_cache = None
+        if settings.RESPONSE_CACHE_ENABLED:
+            self.response_cache = ResponseCache(
+                similarity_threshold=settings.RESPONSE_CACHE_SIMILARITY,
+                ttl=settings.RESPONSE_CACHE_TTL,
+                max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES
+            )
         
-    def process_document(self, file_path: str) -> Dict[str, Any]:
-        """Process and index a new document"""
+    def _ingest_batch_size(self) -> int:
+        """Chunks per ingest batch; with an embedding pool, large enough for a batch to reach it"""
+        if settings.EMBEDDING_PROCESSES > 1:
+            return max(settings.INGEST_BATCH_SIZE, settings.EMBEDDING_POOL_MIN_TEXTS)
+        return settings.INGEST_BATCH_SIZE
+    
+    def process_document(self, file_path: str, source_name: str = None,
+                         replace_existing: bool = False) -> Dict[str, Any]:
+        """Process and index a new document.
+        
+        Documents are identified by the SHA-256 of their bytes, so uploading
+        unchanged content again is a no-op. With replace_existing, the latest
+        document indexed under the same source name is replaced by this one.
+        """
+        try:
+            document_id = self.document_processor.content_hash(file_path)
+            source_name = source_name or os.path.basename(file_path)
+            
+            if self.is_indexed(document_id):
+                existing = self.vector_store.get_document(document_id)
+                return {
+                    'success': True,
+                    'duplicate': True,
+                    'document_id': document_id,
+                    'type': existing.get('type'),
+                    'chunks_created': 0,
+                    'has_images': existing.get('has_images', False),
+                    'image_analysis': {},
+                    'metadata': existing.get('metadata', {})
+                }
+            
+            # Step 1: Parse document; text is produced lazily as the pipeline pulls it
+            doc_data = self.document_processor.process_document(file_path, stream=True)
+            return self.index_document(doc_data, document_id, source_name, replace_existing=replace_existing)
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def is_indexed(self, document_id: str) -> bool:
+        """Whether a document with this content hash is already indexed without errors"""
+        existing = self.vector_store.get_document(document_id)
+        return existing is not None and not existing.get('error')
+    
+    def index_document(self, doc_data: Dict[str, Any], document_id: str, source_name: str,
+                       analyze_images: bool = True, replace_existing: bool = False) -> Dict[str, Any]:
+        """Analyze, chunk, embed and index an already parsed document.
+        
+        A source name alone does not identify a document, so an earlier
+        document with the same source is only replaced when replace_existing
+        is set.
+        """
         try:
-            # Step 1: Parse document
-            doc_data = self.document_processor.process_document(file_path)
-            document_id = str(uuid.uuid4())
-            
-            # Step 2: Analyze images if present
-            image_analysis = {}
-            if doc_data.get('images'):
-                image_analysis = self.image_classifier.process({
+            text_content = doc_data.get('text_content', [])
+            
+            # Step 2: Analyze images in the background while text is chunked and embedded
+            image_future = None
+            if doc_data.get('images') and analyze_images:
+                summary_units, text_content = self._peek_text_summary(text_content)
+                image_future = self._image_executor.submit(self.image_classifier.process, {
                     'images': doc_data['images'],
-                    'text_content': self._extract_text_summary(doc_data)
+                    'text_content': self._extract_text_summary({'text_content': summary_units})
                 })
             
-            # Step 3: Create chunks for indexing
-            chunks = self._create_chunks(doc_data, image_analysis)
-            
-            # Step 4: Store in vector database
-            self.vector_store.add_document_chunks(chunks, document_id)
+            # Steps 3-4: Chunk, embed and index batch by batch; a replaced version
+            # of the same source is tombstoned when the document is committed
+            previous_document_id = self.vector_store.find_document_by_source(source_name) if replace_existing else None
+            writer = self.vector_store.document_writer(document_id, replaces=previous_document_id)
+            try:
+                chunks = self._create_chunks(text_content, bool(doc_data.get('images')))
+                self.ingestion_pipeline.run(chunks, writer)
+                
+                image_analysis = image_future.result() if image_future is not None else {}
+                placeholder = self._image_placeholder_chunk(doc_data, image_analysis)
+                if placeholder is not None:
+                    writer.write([placeholder], writer.encode([placeholder]))
+                
+                writer.commit({
+                    'source': source_name,
+                    'type': doc_data['type'],
+                    'has_images': bool(doc_data.get('images')),
+                    'metadata': doc_data.get('metadata', {}),
+                    **({'error': doc_data['error']} if doc_data.get('error') else {})
+                })
+            except BaseException:
+                writer.abort()
+                raise
+            if writer.replaces:
+                self._invalidate_responses([writer.replaces])
             
             return {
                 'success': True,
+                'duplicate': False,
                 'document_id': document_id,
+                'replaced_document_id': writer.replaces,
                 'type': doc_data['type'],
-                'chunks_created': len(chunks),
+                'chunks_created': writer.chunk_count,
                 'has_images': bool(doc_data.get('images')),
                 'image_analysis': image_analysis,
                 'metadata': doc_data.get('metadata', {})
@@ -54,53 +150,250 @@ class RAGOrchestrator:
                 'error': str(e)
             }
     
-    def query(self, question: str, k: int = 5) -> Dict[str, Any]:
-        """Process a query through the multi-agent pipeline"""
+    def delete_document(self, document_id: str) -> Dict[str, Any]:
+        """Remove a document and its chunks from the index"""
+        try:
+            if self.vector_store.get_document(document_id) is None:
+                return {'success': False, 'error': f"Unknown document: {document_id}"}
+            chunks_deleted = self.vector_store.delete_document(document_id)
+            self._invalidate_responses([document_id])
+            return {
+                'success': True,
+                'document_id': document_id,
+                'chunks_deleted': chunks_deleted
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def query(self, question: str, k: int = 5, min_score: float = None,
+              filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Process a query through the multi-agent pipeline.
+        
+        Chunks scoring below min_score (default MIN_RELEVANCE_SCORE) are not
+        passed to the generator or verifier. filters scopes retrieval by
+        chunk metadata, e.g. {'document_id': [...], 'exclude_type': 'image_placeholder'}.
+        """
         try:
             # Step 1: Retrieve relevant chunks
-            retrieved_chunks = self.vector_store.similarity_search(question, k=k)
+            min_score = settings.MIN_RELEVANCE_SCORE if min_score is None else min_score
+            query_embedding, retrieved_chunks = self._retrieve(question, k, min_score, filters)
+            return self._answer(question, query_embedding, retrieved_chunks)
             
+        except Exception as e:
+            return self._query_error(e)
+    
+    def query_batch(self, questions: List[str], k: int = 5, min_score: float = None,
+                    filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Answer many questions, retrieving context for all of them in one batched search"""
+        try:
+            min_score = settings.MIN_RELEVANCE_SCORE if min_score is None else min_score
+            query_embeddings = self.vector_store.embed_queries(questions)
+            retrieved = self.vector_store.similarity_search_batch(questions, k=k, min_score=min_score, filters=filters,
+                                                                  query_embeddings=query_embeddings)
+        except Exception as e:
+            return [self._query_error(e) for _ in questions]
+        
+        results = []
+        for question, query_embedding, retrieved_chunks in zip(questions, query_embeddings, retrieved):
+            try:
+                results.append(self._answer(question, query_embedding, retrieved_chunks))
+            except Exception as e:
+                results.append(self._query_error(e))
+        return results
+    
+    async def aquery(self, question: str, k: int = 5, min_score: float = None,
+                     filters: Dict[str, Any] = None, timeout: float = None) -> Dict[str, Any]:
+        """Async query, for serving many concurrent questions from one event loop.
+        
+        Embedding and search run on a bounded thread pool; generator and
+        verifier calls are coroutines on the shared AsyncOpenAI client, so
+        waiting on the model holds no thread. timeout (default QUERY_TIMEOUT)
+        is a deadline for the whole request: when it passes, or the calling
+        task is cancelled, the stage in progress is cancelled with it. An
+        embedding or search already running in the pool finishes in the
+        background and its result is dropped.
+        """
+        timeout = settings.QUERY_TIMEOUT if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(self._aanswer(question, k, min_score, filters), timeout)
+        except asyncio.TimeoutError:
+            return self._query_error(TimeoutError(f"Query exceeded its {timeout:g}s deadline"))
+        except Exception as e:
+            return self._query_error(e)
+    
+    async def _aanswer(self, question: str, k: int, min_score: Optional[float],
+                       filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        min_score = settings.MIN_RELEVANCE_SCORE if min_score is None else min_score
+        query_embedding, retrieved_chunks = await loop.run_in_executor(
+            self._query_executor, self._retrieve, question, k, min_score, filters
+        )
+        if not retrieved_chunks:
+            return self._no_context_result()
+        
+        cache_entry, cached = await loop.run_in_executor(
+            self._query_executor, self._lookup_response, query_embedding, retrieved_chunks
+        )
+        if cached is not None:
+            return cached
+        
+        multimodal_context = self._analyze_multimodal_context(retrieved_chunks)
+        generated = await self.generator.aprocess({
+            'context': retrieved_chunks,
+            'query': question,
+            'multimodal_context': multimodal_context
+        })
+        verification = await self.verifier.aprocess({
+            'response': generated['response'],
+            'context': retrieved_chunks,
+            'query': question
+        })
+        
+        result = self._answer_result(generated['response'], verification, retrieved_chunks, multimodal_context)
+        self._store_response(cache_entry, retrieved_chunks, result)
+        return result
+    
+    def query_stream(self, question: str, k: int = 5, min_score: float = None,
+                     filters: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+        """Like query, but yields the answer while it is generated.
+        
+        Events are {'type': 'token', 'text': ...} for each piece of the
+        answer, {'type': 'verifying'} once generation is done, and finally
+        {'type': 'result', 'result': ...} with the same dict query returns.
+        The verified result may reword the streamed answer.
+        """
+        try:
+            min_score = settings.MIN_RELEVANCE_SCORE if min_score is None else min_score
+            query_embedding, retrieved_chunks = self._retrieve(question, k, min_score, filters)
             if not retrieved_chunks:
-                return {
-                    'success': False,
-                    'response': "I don't have enough information to answer this question. Please upload relevant documents first.",
-                    'confidence': 0.0,
-                    'flags': ['no_relevant_context']
-                }
-            
-            # Step 2: Check for multimodal content
-            multimodal_context = self._analyze_multimodal_context(retrieved_chunks)
+                yield {'type': 'result', 'result': self._no_context_result()}
+                return
             
-            # Step 3: Generate response
-            response = self._generate_response(question, retrieved_chunks, multimodal_context)
+            cache_entry, cached = self._lookup_response(query_embedding, retrieved_chunks)
+            if cached is not None:
+                yield {'type': 'token', 'text': cached['response']}
+                yield {'type': 'result', 'result': cached}
+                return
             
-            # Step 4: Verify response
-            verification = self.verifier.process({
-                'response': response,
+            multimodal_context = self._analyze_multimodal_context(retrieved_chunks)
+            parts = []
+            for text in self.generator.stream({
                 'context': retrieved_chunks,
-                'query': question
-            })
+                'query': question,
+                'multimodal_context': multimodal_context
+            }):
+                parts.append(text)
+                yield {'type': 'token', 'text': text}
             
-            # Step 5: Handle verification results
-            final_response = self._handle_verification(response, verification, multimodal_context)
-            
-            return {
-                'success': True,
-                'response': final_response['response'],
-                'confidence': verification['confidence_score'],
-                'verified': verification['verified'],
-                'flags': verification.get('flags', []),
-                'multimodal_context': multimodal_context,
-                'sources_used': len(retrieved_chunks),
-                'verification_details': verification
-            }
+            yield {'type': 'verifying'}
+            result = self._verify_answer(question, retrieved_chunks, ''.join(parts), multimodal_context)
+            self._store_response(cache_entry, retrieved_chunks, result)
+            yield {'type': 'result', 'result': result}
             
         except Exception as e:
-            return {
-                'success': False,
-                'error': str(e),
-                'response': "An error occurred while processing your question."
-            }
+            yield {'type': 'result', 'result': self._query_error(e)}
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit rates of the response, LLM call and embedding caches"""
+        return {
+            'responses': self.response_cache.stats() if self.response_cache is not None else {},
+            'llm_calls': {
+                'generator': self.generator.cache_stats(),
+                'verifier': self.verifier.cache_stats(),
+                'image_classifier': self.image_classifier.cache_stats()
+            },
+            'embeddings': self.vector_store.embedding_cache_stats()
+        }
+    
+    def _retrieve(self, question: str, k: int, min_score: float, filters: Optional[Dict[str, Any]]):
+        """The question's embedding and its retrieved chunks; the embedding is reused as the response cache key"""
+        query_embedding = self.vector_store.embed_queries([question])[0]
+        retrieved_chunks = self.vector_store.similarity_search(question, k=k, min_score=min_score, filters=filters,
+                                                               query_embedding=query_embedding)
+        return query_embedding, retrieved_chunks
+    
+    def _answer(self, question: str, query_embedding: np.ndarray,
+                retrieved_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Answer from already retrieved chunks, reusing a cached answer to a paraphrase if possible"""
+        if not retrieved_chunks:
+            return self._no_context_result()
+        
+        cache_entry, cached = self._lookup_response(query_embedding, retrieved_chunks)
+        if cached is not None:
+            return cached
+        
+        # Step 2: Check for multimodal content
+        multimodal_context = self._analyze_multimodal_context(retrieved_chunks)
+        
+        # Step 3: Generate response
+        response = self._generate_response(question, retrieved_chunks, multimodal_context)
+        
+        result = self._verify_answer(question, retrieved_chunks, response, multimodal_context)
+        self._store_response(cache_entry, retrieved_chunks, result)
+        return result
+    
+    def _no_context_result(self) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'response': "I don't have enough information to answer this question. Please upload relevant documents first.",
+            'confidence': 0.0,
+            'flags': ['no_relevant_context']
+        }
+    
+    def _lookup_response(self, query_embedding: np.ndarray, retrieved_chunks: List[Dict[str, Any]]):
+        """Returns the response cache entry key for the query and a cached result, if any"""
+        if self.response_cache is None:
+            return None, None
+        entry = (query_embedding, [chunk['chunk_id'] for chunk in retrieved_chunks])
+        return entry, self.response_cache.lookup(*entry)
+    
+    def _store_response(self, entry, retrieved_chunks: List[Dict[str, Any]], result: Dict[str, Any]):
+        if entry is not None:
+            embedding, chunk_ids = entry
+            self.response_cache.store(
+                embedding, chunk_ids, {chunk['metadata']['document_id'] for chunk in retrieved_chunks}, result
+            )
+    
+    def _invalidate_responses(self, document_ids: List[str]):
+        if self.response_cache is not None:
+            self.response_cache.invalidate_documents(document_ids)
+    
+    def _verify_answer(self, question: str, retrieved_chunks: List[Dict[str, Any]], response: str,
+                       multimodal_context: Dict[str, Any]) -> Dict[str, Any]:
+        """Verify a generated response and assemble the query result"""
+        # Step 4: Verify response
+        verification = self.verifier.process({
+            'response': response,
+            'context': retrieved_chunks,
+            'query': question
+        })
+        return self._answer_result(response, verification, retrieved_chunks, multimodal_context)
+    
+    def _answer_result(self, response: str, verification: Dict[str, Any], retrieved_chunks: List[Dict[str, Any]],
+                       multimodal_context: Dict[str, Any]) -> Dict[str, Any]:
+        # Step 5: Handle verification results
+        final_response = self._handle_verification(response, verification, multimodal_context)
+        
+        return {
+            'success': True,
+            'response': final_response['response'],
+            'confidence': verification['confidence_score'],
+            'verified': verification['verified'],
+            'flags': verification.get('flags', []),
+            'multimodal_context': multimodal_context,
+            'sources_used': len(retrieved_chunks),
+            'verification_details': verification
+        }
+    
+    def _query_error(self, error: Exception) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'error': str(error),
+            'response': "An error occurred while processing your question."
+        }
     
     def _extract_text_summary(self, doc_data: Dict[str, Any]) -> str:
         """Extract a summary of text content for image analysis"""
@@ -129,39 +422,40 @@ class RAGOrchestrator:
         
         return '\n'.join(summary_parts)
     
-    def _create_chunks(self, doc_data: Dict[str, Any], image_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _peek_text_summary(self, text_content: Iterable[Dict[str, Any]], max_chars: int = 1000):
+        """Read just enough text units for a summary; returns them and the full, unconsumed stream"""
+        iterator = iter(text_content)
+        head = []
+        char_count = 0
+        for unit in iterator:
+            head.append(unit)
+            char_count += len(unit.get('content', ''))
+            if char_count >= max_chars:
+                break
+        return head, itertools.chain(head, iterator)
+    
+    def _create_chunks(self, text_content: Iterable[Dict[str, Any]], has_images: bool) -> Iterator[Dict[str, Any]]:
         """Create chunks for vector storage"""
-        chunks = []
-        text_content = doc_data.get('text_content', [])
-        
-        for content in text_content:
-            chunk = {
-                'content': content.get('content', ''),
+        # Split extracted text into token-bounded windows the embedding model can see in full
+        for text_chunk in self.chunker.chunk(text_content):
+            yield {
+                **text_chunk,
                 'type': 'text',
-                'page': content.get('page'),
-                'paragraph': content.get('paragraph'),
-                'char_count': content.get('char_count', 0),
-                'has_images': False,
+                # Chunks of documents with images are flagged for multimodal handling
+                'has_images': has_images,
                 'confidence': 1.0
             }
-            
-            # Check if this chunk is associated with images
-            if image_analysis.get('has_images'):
-                chunk['has_images'] = True
-                chunk['image_context'] = image_analysis.get('routing_decision')
-            
-            chunks.append(chunk)
-        
-        # Add image placeholder chunks if images are critical
-        if image_analysis.get('requires_human_review'):
-            chunks.append({
-                'content': f"[IMPORTANT: This document contains {len(doc_data.get('images', []))} images that may contain critical information not available in text. Human review recommended for complete understanding.]",
-                'type': 'image_placeholder',
-                'has_images': True,
-                'confidence': 0.5
-            })
-        
-        return chunks
+    
+    def _image_placeholder_chunk(self, doc_data: Dict[str, Any], image_analysis: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Placeholder chunk added when images are critical"""
+        if not image_analysis.get('requires_human_review'):
+            return None
+        return {
+            'content': f"[IMPORTANT: This document contains {len(doc_data.get('images', []))} images that may contain critical information not available in text. Human review recommended for complete understanding.]",
+            'type': 'image_placeholder',
+            'has_images': True,
+            'confidence': 0.5
+        }
     
     def _analyze_multimodal_context(self, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Analyze multimodal context in retrieved chunks"""
@@ -0,0 +1,39 @@
+import hashlib
+import numpy as np
+import pytest
+from config.settings import settings
+
+
+class FakeEmbeddingModel:
+    """Deterministic stand-in for SentenceTransformer: a unit vector seeded by the text"""
+
+    def __init__(self, name: str = None):
+        self.name = name
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return 384
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+            vector = np.random.default_rng(seed).standard_normal(384).astype('float32')
+            vectors.append(vector / np.linalg.norm(vector))
+        return np.stack(vectors) if vectors else np.zeros((0, 384), dtype='float32')
+
+
+@pytest.fixture
+def store_settings(tmp_path, monkeypatch):
+    """Point the vector store at a temporary directory with a fake embedding model"""
+    import utils.vector_store
+    monkeypatch.setattr(utils.vector_store, 'SentenceTransformer', FakeEmbeddingModel)
+    monkeypatch.setattr(settings, 'VECTOR_DB_PATH', str(tmp_path / 'vector_db'))
+    monkeypatch.setattr(settings, 'EMBEDDING_CACHE_ENABLED', False)
+    monkeypatch.setattr(settings, 'INDEX_TYPE', 'flat')
+    return settings
+
+
+@pytest.fixture
+def vector_store(store_settings):
+    from utils.vector_store import VectorStore
+    return VectorStore()
@@ -0,0 +1,48 @@
+import json
+import pytest
+from config.settings import settings
+from orchestrator.bulk_ingest import BulkIngestor
+
+
+@pytest.fixture
+def orchestrator(store_settings, monkeypatch):
+    monkeypatch.setattr(settings, 'OPENROUTER_API_KEY', 'test-key')
+    from orchestrator.rag_orchestrator import RAGOrchestrator
+    return RAGOrchestrator()
+
+
+def run(orchestrator, checkpoint, root):
+    return dict(BulkIngestor(orchestrator, str(checkpoint), workers=1).run(str(root)))
+
+
+def test_interrupted_runs_resume_from_the_checkpoint(orchestrator, tmp_path):
+    root = tmp_path / 'docs'
+    (root / 'sub').mkdir(parents=True)
+    (root / 'a.txt').write_text('Revenue grew in the first quarter.')
+    (root / 'b.txt').write_text('The office moved to Berlin.')
+    (root / 'sub' / 'c.txt').write_text('Hiring slowed in the second half.')
+    (root / 'notes.md').write_text('Not a supported format.')
+    checkpoint = tmp_path / 'checkpoint.jsonl'
+
+    assert run(orchestrator, checkpoint, root) == {'indexed': 3, 'duplicate': 0, 'failed': 0, 'skipped': 0}
+    assert run(orchestrator, checkpoint, root) == {'indexed': 0, 'duplicate': 0, 'failed': 0, 'skipped': 3}
+
+    # A changed file is indexed again and replaces its earlier version; a copy is a duplicate
+    (root / 'b.txt').write_text('The office moved to Munich last spring.')
+    (root / 'd.txt').write_text('Revenue grew in the first quarter.')
+    assert run(orchestrator, checkpoint, root) == {'indexed': 1, 'duplicate': 1, 'failed': 0, 'skipped': 2}
+    documents = orchestrator.vector_store.segment_store.documents
+    assert sorted(info['source'] for info in documents.values()) == ['a.txt', 'b.txt', 'sub/c.txt']
+
+    # A line torn by a crash mid-write is ignored
+    with open(checkpoint, 'a', encoding='utf-8') as f:
+        f.write('{"path": "' + str(root / 'b.txt'))
+    (root / 'e.txt').write_text('Margins held steady.')
+    assert run(orchestrator, checkpoint, root) == {'indexed': 1, 'duplicate': 0, 'failed': 0, 'skipped': 4}
+    # ... and the entry written after it is still read back
+    assert run(orchestrator, checkpoint, root) == {'indexed': 0, 'duplicate': 0, 'failed': 0, 'skipped': 5}
+
+    lines = checkpoint.read_text().splitlines()
+    assert lines[-2].startswith('{"path": "') and not lines[-2].endswith('}')
+    statuses = [json.loads(line)['status'] for line in lines[:-2] + lines[-1:]]
+    assert sorted(statuses) == ['duplicate'] + ['indexed'] * 5
@@ -0,0 +1,76 @@
+import os
+import numpy as np
+from utils.columnar_store import ColumnarSegment, SegmentBuilder, write_columnar_segment, write_merged_segment
+
+
+def rows(count, document_id='doc-a'):
+    rng = np.random.default_rng(count)
+    vectors = rng.standard_normal((count, 8)).astype('float32')
+    texts = [f'chunk {i} – naïve résumé' if i % 3 else '' for i in range(count)]
+    metadatas = [{
+        'document_id': document_id,
+        'chunk_index': i,
+        'type': 'image_placeholder' if i == count - 1 else 'text',
+        'page': i + 1 if i % 2 else None,
+        'paragraph': None,
+        'has_images': i == count - 1,
+        'confidence': 0.5 if i == 0 else 1.0
+    } for i in range(count)]
+    return vectors, texts, metadatas
+
+
+def test_segment_round_trips_vectors_ids_texts_and_metadata(tmp_path):
+    path = str(tmp_path / 'seg')
+    os.makedirs(path)
+    vectors, texts, metadatas = rows(7)
+    write_columnar_segment(path, vectors, texts, metadatas, np.arange(100, 107))
+
+    segment = ColumnarSegment(path)
+    assert len(segment) == 7
+    np.testing.assert_array_equal(segment.vectors, vectors)
+    np.testing.assert_array_equal(segment.ids, np.arange(100, 107))
+    assert [segment.text(row) for row in range(7)] == texts
+    assert [segment.metadata(row) for row in range(7)] == metadatas
+    segment.close()
+
+
+def test_batched_build_matches_a_single_write(tmp_path):
+    vectors, texts, metadatas = rows(10)
+    path = str(tmp_path / 'batched')
+    os.makedirs(path)
+    builder = SegmentBuilder(path)
+    for start, end in ((0, 4), (4, 9), (9, 10)):
+        builder.add(vectors[start:end], texts[start:end], metadatas[start:end])
+    builder.finish(np.arange(10))
+    builder.close()
+
+    segment = ColumnarSegment(path)
+    np.testing.assert_array_equal(segment.vectors, vectors)
+    assert [segment.text(row) for row in range(10)] == texts
+    assert [segment.metadata(row) for row in range(10)] == metadatas
+    assert not [name for name in os.listdir(path) if name.startswith('vectors-')]
+
+
+def test_merge_keeps_selected_rows_and_remaps_dictionaries(tmp_path):
+    sources = []
+    for name, count, document_id in (('a', 4, 'doc-a'), ('b', 3, 'doc-b')):
+        path = str(tmp_path / name)
+        os.makedirs(path)
+        vectors, texts, metadatas = rows(count, document_id)
+        write_columnar_segment(path, vectors, texts, metadatas, np.arange(count) + (0 if name == 'a' else 10))
+        sources.append((ColumnarSegment(path), vectors, texts, metadatas))
+
+    merged_path = str(tmp_path / 'merged')
+    os.makedirs(merged_path)
+    keep = [np.array([True, False, True, False]), np.array([False, True, True])]
+    assert write_merged_segment(merged_path, [source[0] for source in sources], keep) == 4
+
+    merged = ColumnarSegment(merged_path)
+    expected = [(source, row) for source, mask in zip(sources, keep) for row in np.flatnonzero(mask)]
+    np.testing.assert_array_equal(merged.ids, [0, 2, 11, 12])
+    np.testing.assert_array_equal(merged.vectors, np.stack([source[1][row] for source, row in expected]))
+    assert [merged.text(row) for row in range(4)] == [source[2][row] for source, row in expected]
+    assert [merged.metadata(row) for row in range(4)] == [source[3][row] for source, row in expected]
+    # Only values still referenced stay in the merged dictionary
+    assert merged.dictionary('document_id') == ['doc-a', 'doc-b']
+    assert merged.dictionary('type') == ['text', 'image_placeholder']
@@ -0,0 +1,112 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image
+from PyPDF2 import PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+from config.settings import settings
+import utils.document_processor as document_processor
+from utils.document_processor import DocumentProcessor
+
+
+def image_stream(writer, width, height, data, **entries):
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    stream.update({
+        NameObject('/Type'): NameObject('/XObject'),
+        NameObject('/Subtype'): NameObject('/Image'),
+        NameObject('/Width'): NumberObject(width),
+        NameObject('/Height'): NumberObject(height),
+        NameObject('/BitsPerComponent'): NumberObject(8),
+        **{NameObject(key): value for key, value in entries.items()}
+    })
+    return writer._add_object(stream)
+
+
+def jpeg_bytes(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (10, 120, 200)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def text_pdf(path, page_texts):
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica')
+    }))
+    for text in page_texts:
+        writer.add_blank_page(300, 300)
+        page = writer.pages[-1]
+        content = DecodedStreamObject()
+        content.set_data(f'BT /F1 12 Tf 20 250 Td ({text}) Tj ET'.encode('latin-1'))
+        page[NameObject('/Contents')] = writer._add_object(content)
+        page['/Resources'][NameObject('/Font')] = DictionaryObject({NameObject('/F1'): font})
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return str(path)
+
+
+@pytest.fixture
+def pdf_with_images(tmp_path):
+    """One page holding a raw RGB image, a gray image, a JPEG and a corrupt JPEG"""
+    writer = PdfWriter()
+    writer.add_blank_page(300, 300)
+    page = writer.pages[0]
+    pixels = np.random.default_rng(0).integers(0, 255, (150, 200, 3), dtype='uint8')
+    xobjects = DictionaryObject({
+        NameObject('/Im1'): image_stream(writer, 200, 150, pixels.tobytes(), **{'/ColorSpace': NameObject('/DeviceRGB')}),
+        NameObject('/Im2'): image_stream(writer, 200, 150, pixels[..., 0].tobytes(), **{'/ColorSpace': NameObject('/DeviceGray')}),
+        NameObject('/Im3'): image_stream(writer, 160, 120, jpeg_bytes(160, 120), **{
+            '/ColorSpace': NameObject('/DeviceRGB'), '/Filter': NameObject('/DCTDecode')}),
+        NameObject('/Im4'): image_stream(writer, 160, 120, b'not a jpeg', **{
+            '/ColorSpace': NameObject('/DeviceRGB'), '/Filter': NameObject('/DCTDecode')}),
+    })
+    page['/Resources'][NameObject('/XObject')] = xobjects
+    path = tmp_path / 'images.pdf'
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return str(path)
+
+
+def test_each_pdf_image_is_decoded_once_and_alone(pdf_with_images, monkeypatch):
+    decoded = []
+    decode = document_processor._decode_pdf_image
+    monkeypatch.setattr(document_processor, '_decode_pdf_image',
+                        lambda xobject: decoded.append(xobject['/Width']) or decode(xobject))
+
+    images = DocumentProcessor().process_document(pdf_with_images)['images']
+    assert [image['name'] for image in images] == ['/Im1', '/Im2', '/Im3', '/Im4']
+    assert decoded == []
+
+    assert images[0]['size'] == (200, 150)
+    assert len(decoded) == 1
+    assert images[1]['size'] == (200, 150)
+    assert images[2]['size'] == (160, 120)
+    assert len(decoded) == 3
+    # A corrupt sibling only loses its own payload
+    assert 'base64' not in images[3]
+    assert len(decoded) == 4
+
+
+def test_pdf_text_workers_are_spawned_once_and_reused(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'PDF_EXTRACTION_WORKERS', 2)
+    monkeypatch.setattr(settings, 'PDF_PARALLEL_MIN_PAGES', 2)
+    processor = DocumentProcessor()
+    try:
+        first = text_pdf(tmp_path / 'first.pdf', [f'first page {n}' for n in range(5)])
+        second = text_pdf(tmp_path / 'second.pdf', [f'second page {n}' for n in range(3)])
+
+        units = processor.process_document(first)['text_content']
+        pool = processor._text_pool
+        assert [unit['content'] for unit in units] == [f'first page {n}' for n in range(5)]
+        assert [unit['page'] for unit in units] == [1, 2, 3, 4, 5]
+        assert pool._mp_context.get_start_method() == 'spawn'
+
+        units = processor.process_document(second)['text_content']
+        assert [unit['content'] for unit in units] == [f'second page {n}' for n in range(3)]
+        assert processor._text_pool is pool
+    finally:
+        processor.close()
+    assert processor._text_pool is None
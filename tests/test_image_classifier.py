@@ -0,0 +1,84 @@
+import io
+import tracemalloc
+import pytest
+from PIL import Image
+from config.settings import settings
+import utils.image_preprocessing
+from utils.image_preprocessing import LazyImage
+
+
+def png_bytes(size=(300, 200)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def classifier(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'OPENROUTER_API_KEY', 'test-key')
+    monkeypatch.setattr(settings, 'VECTOR_DB_PATH', str(tmp_path / 'vector_db'))
+    monkeypatch.setattr(settings, 'IMAGE_CACHE_ENABLED', False)
+    from agents.image_classifier import ImageClassifierAgent
+    agent = ImageClassifierAgent()
+    monkeypatch.setattr(agent, '_analyze_image_content', lambda image, context, image_hash=None: {
+        'type': 'chart', 'importance': 'low', 'encoded_bytes': image['encoded_bytes']
+    })
+    return agent
+
+
+def test_images_are_released_once_classified(classifier):
+    images = [LazyImage(png_bytes, page=1), LazyImage(lambda: b'not an image', page=2)]
+
+    result = classifier.process({'images': images, 'text_content': 'Quarterly revenue'})
+
+    assert result['image_analysis'][0]['type'] == 'chart'
+    assert result['image_analysis'][1]['type'] == 'unprocessable'
+    assert all(image._prepared is None for image in images)
+
+
+def test_duplicate_images_are_matched_by_the_hash_taken_at_preparation(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'OPENROUTER_API_KEY', 'test-key')
+    monkeypatch.setattr(settings, 'VECTOR_DB_PATH', str(tmp_path / 'vector_db'))
+    monkeypatch.setattr(settings, 'IMAGE_CACHE_ENABLED', True)
+    monkeypatch.setattr(settings, 'IMAGE_ANALYSIS_MAX_WORKERS', 1)
+    import agents.image_classifier
+    from agents.image_classifier import ImageClassifierAgent
+    agent = ImageClassifierAgent()
+    analyzed = []
+
+    def analyze(image, context, image_hash=None):
+        analyzed.append(image_hash)
+        analysis = {'type': 'chart', 'importance': 'low'}
+        agent.analysis_cache.put(image_hash, analysis)
+        return analysis
+
+    monkeypatch.setattr(agent, '_analyze_image_content', analyze)
+    monkeypatch.setattr(agents.image_classifier, 'dhash_base64', lambda data: pytest.fail('base64 decoded again'))
+
+    # The same figure at two resolutions
+    images = [LazyImage(png_bytes, page=1), LazyImage(lambda: png_bytes((600, 400)), page=2)]
+    result = agent.process({'images': images, 'text_content': 'Quarterly revenue'})
+
+    assert [analysis['type'] for analysis in result['image_analysis']] == ['chart', 'chart']
+    assert len(analyzed) == 1 and analyzed[0] is not None
+
+
+def test_loader_bytes_are_freed_before_the_upload_copy_is_encoded(monkeypatch):
+    def bitmap():
+        buffer = io.BytesIO()
+        Image.new('RGB', (2000, 2000), (10, 120, 200)).save(buffer, format='BMP')
+        return buffer.getvalue()
+
+    held = []
+    encode = utils.image_preprocessing.encode_base64
+    monkeypatch.setattr(utils.image_preprocessing, 'encode_base64',
+                        lambda stream: held.append(tracemalloc.get_traced_memory()[0]) or encode(stream))
+    tracemalloc.start()
+    try:
+        image = LazyImage(bitmap, max_side=256)
+        assert image['size'] == (256, 256)
+    finally:
+        tracemalloc.stop()
+
+    # The 12 MB bitmap is gone by the time base64 encoding starts
+    assert held[0] < 4 * 1024 * 1024
@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+import pytest
+from agents.base_agent import BaseAgent
+from config.settings import settings
+from utils.llm_cache import LLMCache, request_key
+
+
+def test_disk_tier_evicts_least_recently_used_rows_in_batches(tmp_path):
+    path = str(tmp_path / 'llm_cache.sqlite')
+    cache = LLMCache(path, max_memory_items=1, max_disk_items=10)
+    statements = []
+    cache._connection.set_trace_callback(statements.append)
+
+    for i in range(10):
+        cache.put(f'key-{i}', {'content': f'answer {i}'})
+    cache.get('key-0')
+    assert not any(statement.startswith('DELETE') for statement in statements)
+
+    # The eleventh row trims the table to nine, oldest access first
+    cache.put('key-10', {'content': 'answer 10'})
+    assert sum(statement.startswith('DELETE') for statement in statements) == 1
+    assert cache._disk_items == 9
+    assert cache.get('key-1') is None and cache.get('key-2') is None
+    assert cache.get('key-0') == {'content': 'answer 0'}
+
+    # Replacing a stored row does not count as a new one, also after reopening
+    cache.put('key-10', {'content': 'answer 10 again'})
+    reopened = LLMCache(path, max_memory_items=1, max_disk_items=10)
+    assert reopened._disk_items == 9
+    assert reopened.get('key-10') == {'content': 'answer 10 again'}
+
+
+def test_entries_are_served_from_memory_then_disk_after_reopening(tmp_path):
+    path = str(tmp_path / 'llm_cache.sqlite')
+    cache = LLMCache(path, max_memory_items=2)
+    for i in range(3):
+        cache.put(f'key-{i}', {'content': f'answer {i}'})
+
+    assert cache.get('key-2') == {'content': 'answer 2'}
+    # key-0 fell out of the memory LRU but is still on disk
+    assert cache.get('key-0') == {'content': 'answer 0'}
+    assert cache.get('key-missing') is None
+    assert cache.stats() == {'memory_hits': 1, 'disk_hits': 1, 'misses': 1, 'hit_rate': pytest.approx(2 / 3),
+                             'memory_items': 2}
+
+    reopened = LLMCache(path)
+    assert reopened.get('key-1') == {'content': 'answer 1'}
+    assert reopened.stats()['disk_hits'] == 1
+
+
+def test_request_key_depends_on_every_request_field():
+    request = {'model': 'm', 'messages': [{'role': 'user', 'content': 'hi'}], 'temperature': 0.0, 'max_tokens': 10}
+
+    assert request_key(request) == request_key(dict(reversed(list(request.items()))))
+    for field, value in (('model', 'other'), ('messages', []), ('temperature', 0.5), ('max_tokens', 11)):
+        assert request_key({**request, field: value}) != request_key(request)
+
+
+class EchoAgent(BaseAgent):
+    def process(self, input_data):
+        return self._make_api_call([{'role': 'user', 'content': input_data}])
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **request):
+        self.calls += 1
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=f"reply {self.calls}"))],
+            usage=SimpleNamespace(prompt_tokens=5, completion_tokens=2)
+        )
+
+
+def agent_with_fake_client(temperature, cache, **kwargs):
+    agent = EchoAgent(model_name='stub', temperature=temperature, cache=cache, **kwargs)
+    completions = FakeCompletions()
+    agent.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return agent, completions
+
+
+def test_agents_reuse_cached_completions_only_when_deterministic(monkeypatch):
+    monkeypatch.setattr(settings, 'OPENROUTER_API_KEY', 'test-key')
+    messages = [{'role': 'user', 'content': 'Summarize the report'}]
+
+    agent, completions = agent_with_fake_client(0.0, LLMCache())
+    usage = {}
+    assert agent._make_api_call(messages, usage=usage) == 'reply 1'
+    assert agent._make_api_call(messages, usage=usage) == 'reply 1'
+    assert completions.calls == 1
+    assert usage == {'calls': 1, 'prompt_tokens': 5, 'completion_tokens': 2, 'cached_calls': 1}
+    assert agent.cache_stats()['hits'] == 1 and agent.cache_stats()['misses'] == 1
+
+    # Sampling at a higher temperature is not cached unless asked for
+    agent, completions = agent_with_fake_client(0.7, LLMCache())
+    agent._make_api_call(messages)
+    agent._make_api_call(messages)
+    assert completions.calls == 2 and not agent.cache_stats()['enabled']
+
+    agent, completions = agent_with_fake_client(0.7, LLMCache(), cache_nondeterministic=True)
+    agent._make_api_call(messages)
+    agent._make_api_call(messages)
+    assert completions.calls == 1
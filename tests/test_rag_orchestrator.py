@@ -0,0 +1,147 @@
+import pytest
+from config.settings import settings
+from tests.conftest import FakeEmbeddingModel
+
+
+@pytest.fixture
+def orchestrator(store_settings, monkeypatch):
+    monkeypatch.setattr(settings, 'OPENROUTER_API_KEY', 'test-key')
+    from orchestrator.rag_orchestrator import RAGOrchestrator
+    return RAGOrchestrator()
+
+
+def parsed(text):
+    return {'type': 'txt', 'text_content': [{'content': text, 'paragraph': 1}], 'metadata': {}}
+
+
+@pytest.fixture
+def answering(orchestrator, monkeypatch):
+    """Orchestrator whose generator and verifier are replaced by a counter of generated answers"""
+    generated = []
+
+    def generate(question, context, multimodal_context):
+        generated.append(question)
+        return f'answer {len(generated)}'
+
+    def verify(question, retrieved_chunks, response, multimodal_context):
+        return {'success': True, 'response': response, 'sources': retrieved_chunks}
+
+    monkeypatch.setattr(orchestrator, '_generate_response', generate)
+    monkeypatch.setattr(orchestrator, '_verify_answer', verify)
+    orchestrator.generated = generated
+    return orchestrator
+
+
+def test_same_file_name_is_kept_unless_replacement_requested(orchestrator):
+    first = orchestrator.index_document(parsed('Revenue grew in the first quarter.'), 'hash-a', 'report.txt')
+    second = orchestrator.index_document(parsed('The office moved to Berlin.'), 'hash-b', 'report.txt')
+
+    assert first['success'] and second['success']
+    assert second['replaced_document_id'] is None
+    assert orchestrator.vector_store.has_document('hash-a')
+    assert orchestrator.vector_store.has_document('hash-b')
+
+    third = orchestrator.index_document(parsed('The office moved to Munich.'), 'hash-c', 'report.txt',
+                                        replace_existing=True)
+    assert third['replaced_document_id'] == 'hash-b'
+    assert not orchestrator.vector_store.has_document('hash-b')
+    assert orchestrator.vector_store.has_document('hash-a')
+
+
+class PooledEmbeddingModel(FakeEmbeddingModel):
+    """Fake model that records which encode calls went through a multi-process pool"""
+    pooled = []
+
+    def start_multi_process_pool(self, target_devices):
+        return {'devices': target_devices}
+
+    def stop_multi_process_pool(self, pool):
+        pass
+
+    def encode(self, texts, pool=None, **kwargs):
+        if pool is not None:
+            self.pooled.append(len(texts))
+        return super().encode(texts)
+
+
+def test_ingest_batches_reach_the_embedding_pool(store_settings, monkeypatch):
+    import utils.vector_store
+    monkeypatch.setattr(utils.vector_store, 'SentenceTransformer', PooledEmbeddingModel)
+    monkeypatch.setattr(PooledEmbeddingModel, 'pooled', [])
+    monkeypatch.setattr(settings, 'OPENROUTER_API_KEY', 'test-key')
+    monkeypatch.setattr(settings, 'EMBEDDING_PROCESSES', 2)
+    monkeypatch.setattr(settings, 'EMBEDDING_POOL_MIN_TEXTS', 16)
+    monkeypatch.setattr(settings, 'INGEST_BATCH_SIZE', 4)
+    monkeypatch.setattr(settings, 'CHUNK_SIZE', 8)
+    monkeypatch.setattr(settings, 'CHUNK_OVERLAP', 0)
+    from orchestrator.rag_orchestrator import RAGOrchestrator
+    orchestrator = RAGOrchestrator()
+
+    # Forty eight-word paragraphs, one chunk each
+    units = [{'content': f'Paragraph {n} covers the revenue of quarter {n}', 'paragraph': n + 1}
+             for n in range(40)]
+    result = orchestrator.index_document({'type': 'txt', 'text_content': units, 'metadata': {}}, 'hash-a', 'a.txt')
+
+    assert result['success'] and result['chunks_created'] == 40
+    assert PooledEmbeddingModel.pooled == [16, 16]
+
+
+def test_query_embeds_the_question_once(answering, monkeypatch):
+    answering.index_document(parsed('Revenue grew in the first quarter.'), 'hash-a', 'report.txt')
+    encoded = []
+    encode = answering.vector_store._encode
+    monkeypatch.setattr(answering.vector_store, '_encode', lambda texts, *args: encoded.extend(texts) or encode(texts, *args))
+
+    first = answering.query('How did revenue change?', min_score=-1.0)
+    second = answering.query('How did revenue change?', min_score=-1.0)
+
+    assert first['response'] == second['response'] == 'answer 1'
+    assert encoded == ['How did revenue change?'] * 2
+
+
+def test_repeated_question_is_answered_from_the_response_cache_until_its_document_changes(answering):
+    answering.index_document(parsed('Revenue grew in the first quarter.'), 'hash-a', 'report.txt')
+    answering.index_document(parsed('The office moved to Berlin.'), 'hash-b', 'office.txt')
+
+    def ask():
+        # Scoped to the report, whichever version of it is indexed
+        return answering.query('How did revenue change?', min_score=-1.0,
+                               filters={'document_id': ['hash-a', 'hash-d']})
+
+    first, second = ask(), ask()
+    assert answering.generated == ['How did revenue change?']
+    assert second['cached'] and second['response'] == first['response']
+
+    # Replacing a document the answer did not draw on keeps the entry
+    answering.index_document(parsed('The office moved to Munich.'), 'hash-c', 'office.txt', replace_existing=True)
+    assert answering.cache_stats()['responses']['entries'] == 1
+    assert ask()['cached']
+
+    # Replacing the one it drew on drops it
+    answering.index_document(parsed('Revenue fell in the first quarter.'), 'hash-d', 'report.txt',
+                             replace_existing=True)
+    assert answering.cache_stats()['responses']['entries'] == 0
+    assert not ask().get('cached')
+    assert answering.generated == ['How did revenue change?'] * 2
+
+
+def test_stream_yields_tokens_then_verifying_then_the_result(answering, monkeypatch):
+    answering.index_document(parsed('Revenue grew in the first quarter.'), 'hash-a', 'report.txt')
+    monkeypatch.setattr(answering.generator, 'stream', lambda input_data: iter(['Revenue ', 'grew.']))
+
+    events = list(answering.query_stream('How did revenue change?', min_score=-1.0))
+    assert [event['type'] for event in events] == ['token', 'token', 'verifying', 'result']
+    assert [event['text'] for event in events[:2]] == ['Revenue ', 'grew.']
+    assert events[-1]['result']['response'] == 'Revenue grew.'
+
+    # A cached answer arrives as one token followed by the result
+    events = list(answering.query_stream('How did revenue change?', min_score=-1.0))
+    assert [event['type'] for event in events] == ['token', 'result']
+    assert events[0]['text'] == 'Revenue grew.' and events[1]['result']['cached']
+
+
+def test_stream_without_context_yields_only_the_result(answering):
+    events = list(answering.query_stream('How did revenue change?'))
+
+    assert [event['type'] for event in events] == ['result']
+    assert events[0]['result']['flags'] == ['no_relevant_context']
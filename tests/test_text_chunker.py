@@ -0,0 +1,50 @@
+from utils.text_chunker import TextChunker
+
+
+def words(start, stop):
+    return ' '.join(f'w{i}' for i in range(start, stop))
+
+
+def test_long_units_are_split_into_overlapping_windows():
+    chunker = TextChunker(chunk_size=10, chunk_overlap=3)
+    text = words(0, 25)
+    chunks = list(chunker.chunk([{'content': text, 'page': 4, 'paragraph': 2}]))
+
+    assert [chunk['content'] for chunk in chunks] == [words(0, 10), words(7, 17), words(14, 24), words(21, 25)]
+    assert [chunk['token_count'] for chunk in chunks] == [10, 10, 10, 4]
+    for chunk in chunks:
+        assert (chunk['page'], chunk['paragraph']) == (4, 2)
+        assert text[chunk['char_start']:chunk['char_start'] + chunk['char_count']] == chunk['content']
+        assert 'page_end' not in chunk
+
+
+def test_a_tail_that_is_only_overlap_is_not_emitted():
+    chunker = TextChunker(chunk_size=10, chunk_overlap=3)
+    chunks = list(chunker.chunk([{'content': words(0, 17)}]))
+
+    assert [chunk['content'] for chunk in chunks] == [words(0, 10), words(7, 17)]
+
+
+def test_small_units_are_packed_with_their_provenance_range():
+    chunker = TextChunker(chunk_size=10, chunk_overlap=3)
+    units = [
+        {'content': 'a b c d', 'page': 1, 'paragraph': 1},
+        {'content': '   ', 'page': 1, 'paragraph': 2},
+        {'content': 'e f g h', 'page': 2, 'paragraph': 3},
+        {'content': 'i j k l m', 'page': 2, 'paragraph': 4}
+    ]
+    first, second = chunker.chunk(units)
+
+    assert first['content'] == 'a b c d\ne f g h\ni j'
+    assert (first['page'], first['paragraph'], first['page_end'], first['paragraph_end']) == (1, 1, 2, 4)
+    # The overlap carries the last three tokens, across a unit boundary
+    assert second['content'] == 'h\ni j k l m'
+    assert (second['page'], second['paragraph'], second['char_start']) == (2, 3, 6)
+    assert second['paragraph_end'] == 4
+
+
+def test_overlap_and_size_are_bounded():
+    chunker = TextChunker(chunk_size=600, chunk_overlap=400, max_tokens=254)
+
+    assert chunker.chunk_size == 254
+    assert chunker.chunk_overlap == 127
@@ -0,0 +1,192 @@
+import os
+import pickle
+import threading
+import faiss
+import numpy as np
+import pytest
+from config.settings import settings
+from tests.conftest import FakeEmbeddingModel
+from utils.vector_store import VectorStore
+
+
+def make_chunks(count, prefix='chunk'):
+    return [{'content': f'{prefix} {i} of the quarterly report'} for i in range(count)]
+
+
+def ingest(store, document_id, chunks, info=None, replaces=None, batch_size=10):
+    writer = store.document_writer(document_id, replaces=replaces)
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start:start + batch_size]
+        writer.write(batch, writer.encode(batch))
+    writer.commit(info or {})
+    return writer
+
+
+def test_reingesting_failed_document_replaces_its_chunks(vector_store):
+    chunks = make_chunks(95)
+    ingest(vector_store, 'doc-1', chunks, {'source': 'report.txt', 'error': 'parser timed out'})
+    assert vector_store.total_chunks == 95
+
+    # A retry of the same content hash comes back with replaces=None
+    ingest(vector_store, 'doc-1', chunks, {'source': 'report.txt'})
+
+    assert vector_store.total_chunks == 95
+    assert 'error' not in vector_store.get_document('doc-1')
+    hits = vector_store.similarity_search(chunks[3]['content'], k=5)
+    assert [hit['content'] for hit in hits].count(chunks[3]['content']) == 1
+
+
+def test_reingest_survives_restart(vector_store, store_settings):
+    chunks = make_chunks(30)
+    ingest(vector_store, 'doc-1', chunks, {'error': 'partial'})
+    vector_store.add_document_chunks(chunks, 'doc-1', {'source': 'report.txt'})
+
+    reopened = VectorStore()
+    assert reopened.total_chunks == 30
+    assert len(reopened.similarity_search(chunks[0]['content'], k=30)) == 30
+
+
+def test_uncommitted_batches_are_not_searchable(vector_store):
+    ingest(vector_store, 'old', make_chunks(20), {'source': 'report.txt'})
+
+    writer = vector_store.document_writer('new', replaces='old')
+    batch = make_chunks(20, 'revised')
+    writer.write(batch, writer.encode(batch))
+    hits = vector_store.similarity_search(batch[0]['content'], k=40)
+    assert {hit['metadata']['document_id'] for hit in hits} == {'old'}
+
+    writer.abort()
+    assert vector_store.total_chunks == 20
+    assert vector_store.get_document('new') is None
+
+
+def test_legacy_index_documents_are_registered_and_deletable(store_settings):
+    # The pre-segment format: one flat index plus pickled texts and metadata
+    texts = [f'legacy chunk {i}' for i in range(5)]
+    metadatas = [{'document_id': 'old-a' if i < 3 else 'old-b', 'chunk_index': i, 'type': 'text',
+                  'has_images': i == 4} for i in range(5)]
+    os.makedirs(store_settings.VECTOR_DB_PATH)
+    index = faiss.IndexFlatIP(384)
+    index.add(FakeEmbeddingModel().encode(texts))
+    faiss.write_index(index, os.path.join(store_settings.VECTOR_DB_PATH, 'faiss_index.bin'))
+    with open(os.path.join(store_settings.VECTOR_DB_PATH, 'metadata.pkl'), 'wb') as f:
+        pickle.dump({'texts': texts, 'metadatas': metadatas}, f)
+
+    store = VectorStore()
+    assert store.total_chunks == 5
+    assert store.get_document('old-a')['chunks'] == 3
+    assert store.get_document('old-b') == {'chunks': 2, 'has_images': True, 'migrated': True}
+
+    assert store.delete_document('old-a') == 3
+    assert store.get_document('old-a') is None
+    assert [hit['metadata']['document_id'] for hit in store.similarity_search('legacy chunk 1', k=5)] == ['old-b'] * 2
+
+
+def test_searches_run_side_by_side_and_publish_waits_only_to_add(vector_store):
+    ingest(vector_store, 'doc-1', make_chunks(20))
+    results = []
+    search = threading.Thread(target=lambda: results.append(vector_store.similarity_search('chunk 3', k=3)))
+    with vector_store._index_lock.read():
+        # Another search gets in while this one holds the index
+        search.start()
+        search.join(timeout=5)
+        assert not search.is_alive() and len(results[0]) == 3
+
+        # A publish records its segment, then waits for searches before adding vectors
+        commit = threading.Thread(target=ingest, args=(vector_store, 'doc-2', make_chunks(5, 'other')))
+        commit.start()
+        commit.join(timeout=0.5)
+        assert commit.is_alive()
+        assert vector_store.has_document('doc-2')
+        assert vector_store.index.ntotal == 20
+    commit.join(timeout=5)
+    assert not commit.is_alive()
+    assert vector_store.index.ntotal == 25
+
+
+@pytest.mark.parametrize('index_type', ['flat', 'hnsw', 'ivfpq'])
+def test_each_index_type_adds_deletes_and_reopens(store_settings, monkeypatch, index_type):
+    monkeypatch.setattr(settings, 'INDEX_TYPE', index_type)
+    monkeypatch.setattr(settings, 'AUTO_COMPACT', False)
+    # Small enough for IVF-PQ to train on a few hundred chunks
+    monkeypatch.setattr(settings, 'IVF_NLIST', 4)
+    monkeypatch.setattr(settings, 'IVF_NPROBE', 4)
+    monkeypatch.setattr(settings, 'PQ_M', 8)
+    monkeypatch.setattr(settings, 'PQ_NBITS', 4)
+    store = VectorStore()
+    ingest(store, 'keep', make_chunks(150, 'kept'), batch_size=50)
+    ingest(store, 'drop', make_chunks(50, 'dropped'), batch_size=50)
+    assert store.active_index_type == index_type
+    assert store.index.ntotal == 200
+
+    store.delete_document('drop')
+    for current in (store, VectorStore()):
+        assert current.active_index_type == index_type
+        assert current.get_document('drop') is None
+        hits = current.similarity_search('dropped 7 of the quarterly report', k=20, min_score=-1.0)
+        assert len(hits) == 20
+        assert {hit['metadata']['document_id'] for hit in hits} == {'keep'}
+        if index_type != 'ivfpq':
+            # Exact text finds itself; PQ codes are too coarse to promise that
+            top = current.similarity_search('kept 7 of the quarterly report', k=1)[0]
+            assert top['content'] == 'kept 7 of the quarterly report'
+
+
+def test_cosine_min_score_is_a_similarity_threshold(vector_store):
+    chunks = make_chunks(10)
+    ingest(vector_store, 'doc-1', chunks)
+    query = 'chunk 3 of the quarterly report'
+    model = FakeEmbeddingModel()
+    expected = model.encode([chunk['content'] for chunk in chunks]) @ model.encode([query])[0]
+
+    hits = vector_store.similarity_search(query, k=10, min_score=-1.0)
+    scores = {hit['content']: hit['relevance_score'] for hit in hits}
+    assert scores == pytest.approx({chunk['content']: float(score) for chunk, score in zip(chunks, expected)},
+                                   abs=1e-5)
+    assert all(hit['distance'] == pytest.approx(1 - hit['relevance_score']) for hit in hits)
+
+    threshold = float(np.sort(expected)[-3])
+    kept = vector_store.similarity_search(query, k=10, min_score=threshold - 1e-6)
+    assert len(kept) == 3 and kept[0]['relevance_score'] == pytest.approx(1.0)
+    assert all(hit['relevance_score'] >= threshold - 1e-6 for hit in kept)
+
+
+@pytest.fixture
+def filterable_store(vector_store):
+    ingest(vector_store, 'doc-a', [
+        {'content': 'a text page one', 'page': 1},
+        {'content': 'a text page two', 'page': 2},
+        {'content': 'a figure page three', 'page': 3, 'type': 'image_placeholder', 'has_images': True},
+        {'content': 'a text without page'}
+    ])
+    ingest(vector_store, 'doc-b', [
+        {'content': 'b text page one', 'page': 1},
+        {'content': 'b text page five', 'page': 5, 'has_images': True}
+    ])
+    return vector_store
+
+
+@pytest.mark.parametrize('brute_force_max', [50000, 0])
+@pytest.mark.parametrize('filters, expected', [
+    ({'document_id': 'doc-b'}, {'b text page one', 'b text page five'}),
+    ({'document_id': ['doc-a', 'doc-b'], 'page': 1}, {'a text page one', 'b text page one'}),
+    ({'document_id': 'doc-missing'}, set()),
+    ({'type': 'image_placeholder'}, {'a figure page three'}),
+    ({'exclude_type': 'image_placeholder', 'document_id': 'doc-a'},
+     {'a text page one', 'a text page two', 'a text without page'}),
+    ({'has_images': True}, {'a figure page three', 'b text page five'}),
+    ({'has_images': False, 'document_id': 'doc-b'}, {'b text page one'}),
+    ({'page': (2, None)}, {'a text page two', 'a figure page three', 'b text page five'}),
+    ({'page': (None, 2)}, {'a text page one', 'a text page two', 'b text page one'}),
+    ({'page': 3}, {'a figure page three'}),
+])
+def test_each_filter_field(filterable_store, monkeypatch, brute_force_max, filters, expected):
+    monkeypatch.setattr(settings, 'FILTER_BRUTE_FORCE_MAX', brute_force_max)
+    hits = filterable_store.similarity_search('text page', k=10, min_score=-1.0, filters=filters)
+
+    assert {hit['content'] for hit in hits} == expected
+
+
+def test_unknown_filter_fields_are_rejected(filterable_store):
+    with pytest.raises(ValueError):
+        filterable_store.similarity_search('text page', filters={'author': 'someone'})
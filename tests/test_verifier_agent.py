@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from config.settings import settings
+
+REPLY = json.dumps({
+    'is_consistent': True, 'is_grounded': True, 'handles_uncertainty': True,
+    'confidence': 0.9, 'coverage': 0.9, 'overconfidence_detected': False,
+    'issues': [], 'unsupported_claims': [], 'notes': 'stub'
+})
+
+
+class StubCompletions(BaseHTTPRequestHandler):
+    """Chat completions endpoint that answers after server.delay seconds with server.status"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        if self.server.status != 200:
+            body = json.dumps({'error': {'message': 'stub error', 'code': self.server.status}}).encode('utf-8')
+        else:
+            body = json.dumps({
+                'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': 'stub',
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': self.server.reply}}],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}
+            }).encode('utf-8')
+        try:
+            self.send_response(self.server.status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubCompletions)
+    server.daemon_threads = True
+    server.delay = 0.0
+    server.status = 200
+    server.reply = REPLY
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def verifier(stub_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'OPENROUTER_API_KEY', 'test-key')
+    monkeypatch.setattr(settings, 'OPENROUTER_BASE_URL', f'http://127.0.0.1:{stub_server.server_port}/v1')
+    monkeypatch.setattr(settings, 'LLM_CACHE_ENABLED', False)
+    monkeypatch.setattr(settings, 'VERIFICATION_TIMEOUT', 0.5)
+    monkeypatch.setattr(settings, 'VERIFICATION_MODE', 'separate')
+    monkeypatch.setattr(settings, 'MAX_RETRIES', 3)
+    monkeypatch.setattr(settings, 'VERIFICATION_MAX_WORKERS', 3)
+    from agents.verifier_agent import VerifierAgent
+    return VerifierAgent()
+
+
+def verify(agent):
+    started = time.monotonic()
+    result = agent.process({'response': 'Revenue grew 5%.', 'query': 'How did revenue change?',
+                            'context': [{'content': 'Revenue grew 5% in Q1.'}]})
+    return result, time.monotonic() - started
+
+
+def test_slow_checks_fall_back_at_the_deadline(verifier, stub_server):
+    stub_server.delay = 3.0
+    result, elapsed = verify(verifier)
+
+    assert elapsed < 1.0
+    assert result['factual_consistency']['issues'] == ['Verification check did not complete']
+
+
+def test_timed_out_checks_do_not_delay_the_next_verification(verifier, stub_server):
+    stub_server.delay = 3.0
+    verify(verifier)
+
+    stub_server.delay = 0.05
+    result, elapsed = verify(verifier)
+
+    assert elapsed < 0.5
+    assert result['confidence_score'] == pytest.approx(0.9)
+    # Timed-out requests were not retried past the deadline
+    assert stub_server.requests == 6
+
+
+def test_client_errors_are_not_retried(verifier, stub_server):
+    stub_server.status = 401
+    result, elapsed = verify(verifier)
+
+    assert stub_server.requests == 3
+    assert elapsed < 0.3
+    assert result['factual_consistency']['issues'] == ['Could not parse verification result']
+
+    stub_server.requests = 0
+    verifier.mode = 'consolidated'
+    result, elapsed = verify(verifier)
+
+    assert stub_server.requests == 1
+    assert elapsed < 0.3
+
+
+def test_server_errors_are_retried_without_a_final_sleep(verifier, stub_server, monkeypatch):
+    monkeypatch.setattr(settings, 'MAX_RETRIES', 1)
+    monkeypatch.setattr(verifier, 'check_timeout', 5.0)
+    stub_server.status = 503
+    result, elapsed = verify(verifier)
+
+    # One retry per check after a 0.5s backoff, and no backoff once attempts are used up
+    assert stub_server.requests == 6
+    assert elapsed < 1.0
+
+
+def test_check_budget_starts_when_a_worker_picks_it_up(verifier, stub_server):
+    # Two queries share the three workers: the second one's checks queue behind the first's
+    assert verifier._executor._max_workers == 3
+    stub_server.delay = 0.3
+    with ThreadPoolExecutor(max_workers=2) as callers:
+        results = list(callers.map(lambda _: verify(verifier)[0], range(2)))
+
+    assert [result['confidence_score'] for result in results] == [pytest.approx(0.9)] * 2
+
+
+FACTUAL = {'is_consistent': True, 'confidence': 0.8, 'issues': [], 'unsupported_claims': []}
+GROUNDING = {'is_grounded': True, 'confidence': 0.75, 'coverage': 0.6, 'notes': 'grounded'}
+UNCERTAINTY = {'handles_uncertainty': True, 'confidence': 0.9, 'overconfidence_detected': False, 'notes': 'hedged'}
+
+
+def test_consolidated_mode_reads_all_three_checks_from_one_reply(verifier, stub_server):
+    stub_server.reply = json.dumps({'factual_consistency': FACTUAL, 'context_grounding': GROUNDING,
+                                    'uncertainty_handling': UNCERTAINTY})
+    verifier.mode = 'consolidated'
+    result, _ = verify(verifier)
+
+    assert stub_server.requests == 1
+    assert result['verification_mode'] == 'consolidated'
+    assert (result['factual_consistency'], result['context_grounding'], result['uncertainty_handling']) == (
+        FACTUAL, GROUNDING, UNCERTAINTY)
+    assert result['confidence_score'] == pytest.approx(0.75)
+    assert result['token_usage']['calls'] == 1
+
+
+def test_consolidated_parse_falls_back_per_section(verifier):
+    context = [{'content': 'Revenue grew 5% in Q1.'}]
+    parse = verifier._plan_all('Revenue grew 5%.', context, 'How did revenue change?').parse
+    fallbacks = [verifier._fallback_result(check) for check in (
+        verifier._check_factual_consistency, verifier._check_context_grounding, verifier._check_uncertainty_handling)]
+
+    # A missing section and one without a confidence fall back on their own
+    partial = parse(json.dumps({'factual_consistency': FACTUAL, 'context_grounding': {'notes': 'no score'}}))
+    assert partial == [FACTUAL, fallbacks[1], fallbacks[2]]
+    # Unparseable or failed replies fall back entirely
+    assert parse('not json') == fallbacks
+    assert parse(None) == fallbacks
+    assert parse(json.dumps([FACTUAL])) == fallbacks
+
+    # Without context the grounding check fails whatever the model says
+    no_context = verifier._plan_all('Revenue grew 5%.', [], 'How did revenue change?').parse(json.dumps({
+        'factual_consistency': FACTUAL, 'context_grounding': GROUNDING, 'uncertainty_handling': UNCERTAINTY}))
+    assert no_context[1]['confidence'] == 0.0 and not no_context[1]['is_grounded']
+    assert no_context[0] == FACTUAL and no_context[2] == UNCERTAINTY
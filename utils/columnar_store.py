@@ -0,0 +1,330 @@
+import json
+import mmap
+import os
+from typing import List, Dict, Any, Iterable, Optional
+import numpy as np
+
+# Fixed-width columns: name -> (dtype, value stored for None)
+NUMERIC_COLUMNS = {
+    'chunk_index': ('int32', -1),
+    'page': ('int32', -1),
+    'paragraph': ('int32', -1),
+    'has_images': ('bool', False),
+    'confidence': ('float32', 1.0),
+}
+# Low-cardinality string columns, stored as codes into a per-segment dictionary
+DICTIONARY_COLUMNS = {
+    'document_id': 'int32',
+    'type': 'uint8',
+}
+
+SCHEMA_FILE = 'schema.json'
+# Metadata predicates understood by ColumnarSegment.filter_rows
+FILTER_FIELDS = ('document_id', 'type', 'exclude_type', 'has_images', 'page')
+
+
+def _save_array(path: str, array: np.ndarray):
+    with open(path, 'wb') as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_columnar_segment(path: str, vectors: np.ndarray, texts: List[str], metadatas: List[Dict[str, Any]],
+                           ids: np.ndarray = None):
+    """Write vectors, chunk ids, texts and metadata of one segment in columnar form.
+
+    Without ids, chunk_id.npy is left for write_chunk_ids to add later.
+    """
+    builder = SegmentBuilder(path)
+    try:
+        builder.add(vectors, texts, metadatas)
+        builder.finish(ids)
+    finally:
+        builder.close()
+
+
+class SegmentBuilder:
+    """Writes one columnar segment batch by batch.
+
+    Texts go straight to texts.bin and vectors to one part file per batch,
+    which finish() gathers into vectors.npy. Metadata is kept as compact
+    per-batch columns, so memory does not grow with texts or vectors.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._texts = open(os.path.join(path, 'texts.bin'), 'wb')
+        self._text_bytes = 0
+        # Texts: one UTF-8 blob plus count+1 byte offsets
+        self._offsets = [np.zeros(1, dtype='int64')]
+        self._vector_parts: List[str] = []
+        self._numeric: Dict[str, List[np.ndarray]] = {name: [] for name in NUMERIC_COLUMNS}
+        self._vocabularies: Dict[str, Dict[str, int]] = {name: {} for name in DICTIONARY_COLUMNS}
+        self._codes: Dict[str, List[np.ndarray]] = {name: [] for name in DICTIONARY_COLUMNS}
+
+    def add(self, vectors: np.ndarray, texts: List[str], metadatas: List[Dict[str, Any]]):
+        """Append a batch of chunks"""
+        part = os.path.join(self.path, f'vectors-{len(self._vector_parts):06d}.npy')
+        _save_array(part, np.ascontiguousarray(vectors, dtype='float32'))
+        self._vector_parts.append(part)
+
+        lengths = np.zeros(len(texts), dtype='int64')
+        for i, text in enumerate(texts):
+            data = text.encode('utf-8')
+            self._texts.write(data)
+            lengths[i] = len(data)
+        self._offsets.append(self._text_bytes + np.cumsum(lengths))
+        self._text_bytes += int(lengths.sum())
+
+        for name, (dtype, missing) in NUMERIC_COLUMNS.items():
+            values = [metadata.get(name) for metadata in metadatas]
+            self._numeric[name].append(np.array([missing if value is None else value for value in values], dtype=dtype))
+        for name, dtype in DICTIONARY_COLUMNS.items():
+            vocabulary = self._vocabularies[name]
+            codes = [vocabulary.setdefault(str(metadata.get(name, '')), len(vocabulary)) for metadata in metadatas]
+            self._codes[name].append(np.array(codes, dtype=dtype))
+        self.count += len(texts)
+
+    def finish(self, ids: np.ndarray = None):
+        """Write the remaining files; without ids, chunk_id.npy is left for write_chunk_ids"""
+        self._texts.flush()
+        os.fsync(self._texts.fileno())
+        self._texts.close()
+
+        vectors_path = os.path.join(self.path, 'vectors.npy')
+        if len(self._vector_parts) == 1:
+            os.replace(self._vector_parts[0], vectors_path)
+        else:
+            # Stream the parts into a memory-mapped output instead of concatenating in RAM
+            parts = [np.load(part, mmap_mode='r') for part in self._vector_parts]
+            merged = np.lib.format.open_memmap(vectors_path, mode='w+', dtype='float32',
+                                               shape=(self.count, parts[0].shape[1]))
+            position = 0
+            for part in parts:
+                merged[position:position + len(part)] = part
+                position += len(part)
+            merged.flush()
+            del merged, parts
+            for part in self._vector_parts:
+                os.unlink(part)
+        self._vector_parts = []
+
+        if ids is not None:
+            write_chunk_ids(self.path, ids)
+        _save_array(os.path.join(self.path, 'offsets.npy'), np.concatenate(self._offsets))
+        for name, (dtype, _) in NUMERIC_COLUMNS.items():
+            _save_array(os.path.join(self.path, f'{name}.npy'), np.concatenate(self._numeric[name]).astype(dtype))
+        for name, dtype in DICTIONARY_COLUMNS.items():
+            _save_array(os.path.join(self.path, f'{name}.npy'), np.concatenate(self._codes[name]).astype(dtype))
+
+        with open(os.path.join(self.path, SCHEMA_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'count': self.count,
+                       'dictionaries': {name: list(vocabulary) for name, vocabulary in self._vocabularies.items()}}, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        """Release the open text file; the caller removes an unfinished directory"""
+        self._texts.close()
+
+
+def write_chunk_ids(path: str, ids: np.ndarray):
+    _save_array(os.path.join(path, 'chunk_id.npy'), np.asarray(ids, dtype='int64'))
+
+
+def write_merged_segment(path: str, segments: Iterable['ColumnarSegment'], keep: Iterable[np.ndarray]) -> int:
+    """Concatenate columnar segments, keeping only rows where keep is True.
+
+    Rows are copied column by column without materializing Python objects.
+    Returns the number of rows written.
+    """
+    segments = list(segments)
+    keep = [np.asarray(mask, dtype=bool) for mask in keep]
+    count = int(sum(mask.sum() for mask in keep))
+
+    # Stream vectors into a memory-mapped output instead of concatenating in RAM
+    dimension = segments[0].vectors.shape[1]
+    merged_vectors = np.lib.format.open_memmap(
+        os.path.join(path, 'vectors.npy'), mode='w+', dtype='float32', shape=(count, dimension)
+    )
+    position = 0
+    for segment, mask in zip(segments, keep):
+        kept = int(mask.sum())
+        merged_vectors[position:position + kept] = segment.vectors[mask]
+        position += kept
+    merged_vectors.flush()
+    del merged_vectors
+
+    _save_array(os.path.join(path, 'chunk_id.npy'), np.concatenate([segment.ids[mask] for segment, mask in zip(segments, keep)]))
+
+    offsets = [np.zeros(1, dtype='int64')]
+    base = 0
+    with open(os.path.join(path, 'texts.bin'), 'wb') as f:
+        for segment, mask in zip(segments, keep):
+            lengths = np.diff(segment.offsets)[mask]
+            if mask.all():
+                f.write(segment.text_bytes(0, len(segment)))
+            else:
+                for row in np.flatnonzero(mask):
+                    f.write(segment.text_bytes(row, row + 1))
+            offsets.append(base + np.cumsum(lengths))
+            base += int(lengths.sum())
+        f.flush()
+        os.fsync(f.fileno())
+    _save_array(os.path.join(path, 'offsets.npy'), np.concatenate(offsets).astype('int64'))
+
+    for name in NUMERIC_COLUMNS:
+        _save_array(os.path.join(path, f'{name}.npy'),
+                    np.concatenate([segment.column(name)[mask] for segment, mask in zip(segments, keep)]))
+
+    dictionaries = {}
+    for name, dtype in DICTIONARY_COLUMNS.items():
+        vocabulary: Dict[str, int] = {}
+        remapped = []
+        for segment, mask in zip(segments, keep):
+            codes = segment.column(name)[mask]
+            # Translate the segment's local codes into the merged dictionary, dropping unused values
+            values = segment.dictionary(name)
+            lookup = np.zeros(len(values), dtype=dtype)
+            for code in np.unique(codes):
+                lookup[code] = vocabulary.setdefault(values[code], len(vocabulary))
+            remapped.append(lookup[codes])
+        dictionaries[name] = list(vocabulary)
+        _save_array(os.path.join(path, f'{name}.npy'), np.concatenate(remapped))
+
+    with open(os.path.join(path, SCHEMA_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'count': count, 'dictionaries': dictionaries}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    return count
+
+
+class ColumnarSegment:
+    """Read-only, memory-mapped view of a columnar segment.
+
+    Opening a segment only maps files; rows are decoded on demand, so
+    memory use and load time do not grow with the number of chunks.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, SCHEMA_FILE), 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+        self.count = schema['count']
+        self._dictionaries = schema['dictionaries']
+        self._columns: Dict[str, np.ndarray] = {}
+        self._text_file = None
+        self._text_map: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _load(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+        return self._columns[name]
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._load('vectors')
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Stable chunk ids, ascending within the segment"""
+        return self._load('chunk_id')
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._load('offsets')
+
+    def column(self, name: str) -> np.ndarray:
+        """Raw typed array for a metadata column"""
+        return self._load(name)
+
+    def dictionary(self, name: str) -> List[str]:
+        """Values referenced by the codes of a dictionary column"""
+        return self._dictionaries[name]
+
+    def filter_rows(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Local row numbers matching every metadata predicate.
+        
+        document_id / type / exclude_type take a value or a list of values,
+        has_images a bool and page a number or an inclusive (first, last)
+        range where either bound may be None. Dictionary predicates are
+        checked against the segment's vocabulary first, so segments that
+        cannot match are skipped without reading their columns.
+        """
+        unknown = set(filters) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unsupported filter fields: {sorted(unknown)}")
+        
+        mask = None
+        for name in FILTER_FIELDS:
+            value = filters.get(name)
+            if value is None:
+                continue
+            if name in ('document_id', 'type'):
+                codes = self._dictionary_codes(name, value)
+                if not codes:
+                    return np.zeros(0, dtype=np.int64)
+                matches = np.isin(self.column(name), codes)
+            elif name == 'exclude_type':
+                codes = self._dictionary_codes('type', value)
+                if not codes:
+                    continue
+                matches = ~np.isin(self.column('type'), codes)
+            elif name == 'has_images':
+                matches = self.column('has_images') == bool(value)
+            else:
+                first, last = value if isinstance(value, (list, tuple)) else (value, value)
+                page = self.column('page')
+                # Rows without a page are stored as -1 and never match a page predicate
+                matches = page >= (first if first is not None else 0)
+                if last is not None:
+                    matches &= page <= last
+            mask = matches if mask is None else mask & matches
+            if not mask.any():
+                return np.zeros(0, dtype=np.int64)
+        
+        return np.arange(len(self), dtype=np.int64) if mask is None else np.flatnonzero(mask)
+    
+    def _dictionary_codes(self, name: str, values: Any) -> List[int]:
+        values = values if isinstance(values, (list, tuple, set)) else [values]
+        vocabulary = self.dictionary(name)
+        return [vocabulary.index(value) for value in values if value in vocabulary]
+    
+    def text_bytes(self, start: int, end: int) -> bytes:
+        """UTF-8 bytes of rows [start, end)"""
+        begin, finish = int(self.offsets[start]), int(self.offsets[end])
+        if finish == begin:
+            return b''
+        if self._text_map is None:
+            self._text_file = open(os.path.join(self.path, 'texts.bin'), 'rb')
+            self._text_map = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._text_map[begin:finish]
+
+    def text(self, row: int) -> str:
+        return self.text_bytes(row, row + 1).decode('utf-8')
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        """Materialize the metadata dict of a single row"""
+        metadata: Dict[str, Any] = {}
+        for name in DICTIONARY_COLUMNS:
+            metadata[name] = self._dictionaries[name][int(self.column(name)[row])]
+        for name, (dtype, missing) in NUMERIC_COLUMNS.items():
+            value = self.column(name)[row].item()
+            if name in ('page', 'paragraph') and value == missing:
+                value = None
+            metadata[name] = value
+        return metadata
+
+    def close(self):
+        """Release mapped files"""
+        self._columns.clear()
+        if self._text_map is not None:
+            self._text_map.close()
+            self._text_file.close()
+            self._text_map = None
+            self._text_file = None
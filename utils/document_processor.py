@@ -1,11 +1,57 @@
 import os
-from typing import List, Dict, Any, Tuple
+import atexit
+import hashlib
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from typing import List, Dict, Any, Iterator, Tuple, Union
 from pathlib import Path
 import PyPDF2
 from docx import Document
 from PIL import Image
-import base64
-import io
+from config.settings import settings
+from utils.image_preprocessing import LazyImage, prepare_image
+
+def _extract_pdf_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract text of pages [start, stop); runs in a worker process that opens the file itself"""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[page_num].extract_text() for page_num in range(start, stop)]
+
+_PDF_COLOR_MODES = {'/DeviceRGB': 'RGB', '/DeviceGray': 'L', '/DeviceCMYK': 'CMYK'}
+_ICC_COLOR_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+
+def _decode_pdf_image(xobject) -> Union[bytes, Image.Image]:
+    """Decode one image XObject: JPEG / JPEG 2000 streams as they are, raw samples as a PIL image"""
+    filters = xobject.get('/Filter', [])
+    filters = filters.get_object() if hasattr(filters, 'get_object') else filters
+    last_filter = filters[-1] if isinstance(filters, list) and filters else filters
+    data = xobject.get_data()
+    if last_filter in ('/DCTDecode', '/JPXDecode'):
+        return data
+    
+    size = (int(xobject['/Width']), int(xobject['/Height']))
+    color_space = xobject.get('/ColorSpace', '/DeviceRGB')
+    color_space = color_space.get_object() if hasattr(color_space, 'get_object') else color_space
+    palette = None
+    if isinstance(color_space, list) and color_space[0] == '/ICCBased':
+        mode = _ICC_COLOR_MODES[int(color_space[1].get_object().get('/N', 3))]
+    elif isinstance(color_space, list) and color_space[0] == '/Indexed':
+        # [/Indexed base hival lookup]; only RGB palettes are expected in practice
+        lookup = color_space[3].get_object()
+        palette = lookup.get_data() if hasattr(lookup, 'get_data') else bytes(lookup)
+        mode = 'P'
+    else:
+        mode = _PDF_COLOR_MODES[color_space]
+    if int(xobject.get('/BitsPerComponent', 8)) == 1:
+        mode = '1'
+    
+    image = Image.frombytes(mode, size, data)
+    if palette is not None:
+        image.putpalette(palette)
+    return image
 
 class DocumentProcessor:
     def __init__(self):
@@ -19,18 +65,48 @@ class DocumentProcessor:
             '.jpeg': self._process_image,
             '.gif': self._process_image
         }
+        # Worker processes for PDF text extraction, started on first use and kept for later documents
+        self._text_pool = None
+        self._text_pool_lock = threading.Lock()
     
-    def process_document(self, file_path: str) -> Dict[str, Any]:
-        """Process any supported document type"""
+    def process_document(self, file_path: str, stream: bool = False) -> Dict[str, Any]:
+        """Process any supported document type.
+        
+        With stream=True, 'text_content' is an iterator that parses on demand
+        instead of a list; parse errors met while iterating are recorded in
+        'error' and end the iteration, and metadata that depends on the full
+        text is filled in once it is exhausted.
+        """
         file_extension = Path(file_path).suffix.lower()
         
         if file_extension not in self.supported_formats:
             raise ValueError(f"Unsupported file format: {file_extension}")
         
         processor = self.supported_formats[file_extension]
-        return processor(file_path)
+        return processor(file_path, stream)
+    
+    def content_hash(self, file_path: str) -> str:
+        """SHA-256 of the raw file bytes, read in blocks"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def _collect_text(self, result: Dict[str, Any], units: Iterator[Dict[str, Any]], stream: bool):
+        """Attach text units to a result, lazily when streaming"""
+        if stream:
+            result['text_content'] = self._guard_text_stream(result, units)
+        else:
+            result['text_content'].extend(units)
+    
+    def _guard_text_stream(self, result: Dict[str, Any], units: Iterator[Dict[str, Any]]):
+        try:
+            yield from units
+        except Exception as e:
+            result['error'] = str(e)
     
-    def _process_pdf(self, file_path: str) -> Dict[str, Any]:
+    def _process_pdf(self, file_path: str, stream: bool = False) -> Dict[str, Any]:
         """Extract text and metadata from PDF"""
         result = {
             'type': 'pdf',
@@ -48,29 +124,143 @@ class DocumentProcessor:
                     'author': pdf_reader.metadata.get('/Author', '') if pdf_reader.metadata else ''
                 }
                 
+                # Collect image XObjects as lazy handles; pixels are decoded on demand
+                seen_images = set()
                 for page_num, page in enumerate(pdf_reader.pages):
-                    text = page.extract_text()
-                    if text.strip():
-                        result['text_content'].append({
-                            'page': page_num + 1,
-                            'content': text.strip(),
-                            'char_count': len(text)
-                        })
-                    
-                    # Check for images (basic detection)
-                    if '/XObject' in page.get('/Resources', {}):
-                        result['images'].append({
-                            'page': page_num + 1,
-                            'detected': True,
-                            'extractable': False  # PDF image extraction is complex
-                        })
+                    result['images'].extend(self._pdf_images(file_path, page_num, page, seen_images))
+            
+            self._collect_text(result, self._iter_pdf_text(file_path, result['metadata']['pages']), stream)
         
         except Exception as e:
             result['error'] = str(e)
         
         return result
     
-    def _process_docx(self, file_path: str) -> Dict[str, Any]:
+    def _iter_pdf_text(self, file_path: str, page_count: int) -> Iterator[Dict[str, Any]]:
+        """Text units of non-empty pages in order, extracted by worker processes for large files"""
+        for page_num, text in enumerate(self._iter_pdf_page_texts(file_path, page_count)):
+            if text.strip():
+                yield {
+                    'page': page_num + 1,
+                    'content': text.strip(),
+                    'char_count': len(text)
+                }
+    
+    def _iter_pdf_page_texts(self, file_path: str, page_count: int) -> Iterator[str]:
+        workers = settings.PDF_EXTRACTION_WORKERS or os.cpu_count() or 1
+        if workers <= 1 or page_count < settings.PDF_PARALLEL_MIN_PAGES:
+            with open(file_path, 'rb') as file:
+                for page in PyPDF2.PdfReader(file).pages:
+                    yield page.extract_text()
+            return
+        
+        # Sized by the setting rather than this file, since the pool outlives it
+        executor = self._get_text_pool(workers)
+        # A few ranges per worker keeps cores busy when page costs are uneven
+        workers = min(workers, page_count)
+        range_size = max(1, -(-page_count // (workers * 4)))
+        ranges = [(start, min(start + range_size, page_count)) for start in range(0, page_count, range_size)]
+        
+        # Keep a bounded window of ranges in flight so a slow consumer does not buffer the whole file
+        pending = deque()
+        try:
+            for start, stop in ranges:
+                pending.append(executor.submit(_extract_pdf_page_range, file_path, start, stop))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            # A consumer that stops early leaves nothing queued on the shared pool
+            for future in pending:
+                future.cancel()
+    
+    def _get_text_pool(self, workers: int) -> ProcessPoolExecutor:
+        # Spawned rather than forked: parsing runs on a background thread of a process
+        # whose torch / tokenizer threads may hold locks a forked child would inherit
+        with self._text_pool_lock:
+            if self._text_pool is None:
+                self._text_pool = ProcessPoolExecutor(max_workers=workers,
+                                                      mp_context=multiprocessing.get_context('spawn'))
+                atexit.register(self.close)
+            return self._text_pool
+    
+    def close(self):
+        """Stop the PDF extraction worker processes, if they were started"""
+        with self._text_pool_lock:
+            if self._text_pool is not None:
+                self._text_pool.shutdown(cancel_futures=True)
+                self._text_pool = None
+    
+    def _pdf_images(self, file_path: str, page_num: int, page, seen: set) -> List[LazyImage]:
+        """Lazy handles for the image XObjects of a page, skipping tiny and repeated ones"""
+        images = []
+        resources = page.get('/Resources')
+        xobjects = resources.get_object().get('/XObject') if resources else None
+        if not xobjects:
+            return images
+        
+        xobjects = xobjects.get_object()
+        for name in xobjects:
+            reference = xobjects.raw_get(name)
+            key = (reference.idnum, reference.generation) if hasattr(reference, 'idnum') else (page_num, name)
+            xobject = xobjects[name].get_object()
+            if xobject.get('/Subtype') != '/Image' or key in seen:
+                continue
+            seen.add(key)
+            
+            width, height = int(xobject.get('/Width', 0)), int(xobject.get('/Height', 0))
+            if not self._is_content_image(width, height):
+                continue
+            images.append(LazyImage(
+                self._pdf_image_loader(file_path, page_num, name),
+                settings.IMAGE_MAX_SIDE,
+                settings.IMAGE_JPEG_QUALITY,
+                page=page_num + 1,
+                detected=True,
+                extractable=True,
+                name=name,
+                width=width,
+                height=height
+            ))
+        return images
+    
+    def _pdf_image_loader(self, file_path: str, page_num: int, name: str):
+        """Loader that reopens the PDF and decodes only the named image XObject"""
+        def load() -> Union[bytes, Image.Image]:
+            with open(file_path, 'rb') as file:
+                page = PyPDF2.PdfReader(file).pages[page_num]
+                xobject = page['/Resources'].get_object()['/XObject'].get_object()[name].get_object()
+                return _decode_pdf_image(xobject)
+        return load
+    
+    def _docx_image(self, rel):
+        """Lazy handle for a DOCX image part, or None if it is too small to matter"""
+        blob = rel.target_part.blob
+        try:
+            # Only the header is parsed here; pixel data is decoded on demand
+            with Image.open(io.BytesIO(blob)) as img:
+                width, height = img.size
+        except Exception:
+            width, height = 0, 0
+        if not self._is_content_image(width, height):
+            return None
+        return LazyImage(
+            lambda: blob,
+            settings.IMAGE_MAX_SIDE,
+            settings.IMAGE_JPEG_QUALITY,
+            detected=True,
+            type='inline_image',
+            rel_id=rel.rId,
+            width=width,
+            height=height
+        )
+    
+    def _is_content_image(self, width: int, height: int) -> bool:
+        """Filter out icons, bullets, rules and other decorative images by size"""
+        return min(width, height) >= settings.IMAGE_MIN_SIDE and width * height >= settings.IMAGE_MIN_PIXELS
+    
+    def _process_docx(self, file_path: str, stream: bool = False) -> Dict[str, Any]:
         """Extract text and images from DOCX"""
         result = {
             'type': 'docx',
@@ -89,30 +279,31 @@ class DocumentProcessor:
                 'author': doc.core_properties.author or ''
             }
             
-            # Extract text content
-            for para_num, paragraph in enumerate(doc.paragraphs):
-                if paragraph.text.strip():
-                    result['text_content'].append({
-                        'paragraph': para_num + 1,
-                        'content': paragraph.text.strip(),
-                        'char_count': len(paragraph.text)
-                    })
-            
-            # Check for inline shapes (images)
+            # Collect image parts as lazy handles
             for rel in doc.part.rels.values():
-                if "image" in rel.target_ref:
-                    result['images'].append({
-                        'detected': True,
-                        'type': 'inline_image',
-                        'rel_id': rel.rId
-                    })
+                if "image" in rel.reltype and not rel.is_external:
+                    image = self._docx_image(rel)
+                    if image is not None:
+                        result['images'].append(image)
+            
+            # Extract text content
+            self._collect_text(result, self._iter_docx_text(doc), stream)
         
         except Exception as e:
             result['error'] = str(e)
         
         return result
     
-    def _process_txt(self, file_path: str) -> Dict[str, Any]:
+    def _iter_docx_text(self, doc) -> Iterator[Dict[str, Any]]:
+        for para_num, paragraph in enumerate(doc.paragraphs):
+            if paragraph.text.strip():
+                yield {
+                    'paragraph': para_num + 1,
+                    'content': paragraph.text.strip(),
+                    'char_count': len(paragraph.text)
+                }
+    
+    def _process_txt(self, file_path: str, stream: bool = False) -> Dict[str, Any]:
         """Process plain text files"""
         result = {
             'type': 'txt',
@@ -122,22 +313,50 @@ class DocumentProcessor:
         }
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-                result['text_content'].append({
-                    'content': content,
-                    'char_count': len(content)
-                })
-                result['metadata'] = {
-                    'size': len(content),
-                    'lines': content.count('\n') + 1
-                }
+            self._collect_text(result, self._iter_txt_text(file_path, result), stream)
         except Exception as e:
             result['error'] = str(e)
         
         return result
     
-    def _process_image(self, file_path: str) -> Dict[str, Any]:
+    def _iter_txt_text(self, file_path: str, result: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Stream the file line by line and emit blank-line separated paragraphs"""
+        size = 0
+        line_count = 0
+        paragraph_lines = []
+        paragraph_num = 0
+
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                size += len(line)
+                line_count += 1
+                if line.strip():
+                    paragraph_lines.append(line)
+                    continue
+                if paragraph_lines:
+                    paragraph_num += 1
+                    yield self._txt_paragraph(paragraph_lines, paragraph_num)
+                    paragraph_lines = []
+
+        if paragraph_lines:
+            paragraph_num += 1
+            yield self._txt_paragraph(paragraph_lines, paragraph_num)
+
+        result['metadata'] = {
+            'size': size,
+            'lines': line_count or 1
+        }
+
+    def _txt_paragraph(self, lines: List[str], paragraph_num: int) -> Dict[str, Any]:
+        """Build a text content entry from the lines of one paragraph"""
+        content = ''.join(lines).strip()
+        return {
+            'paragraph': paragraph_num,
+            'content': content,
+            'char_count': len(content)
+        }
+
+    def _process_image(self, file_path: str, stream: bool = False) -> Dict[str, Any]:
         """Process image files"""
         result = {
             'type': 'image',
@@ -148,24 +367,16 @@ class DocumentProcessor:
         
         try:
             with Image.open(file_path) as img:
-                # Convert to base64 for API calls
-                buffer = io.BytesIO()
-                img.save(buffer, format=img.format or 'PNG')
-                img_str = base64.b64encode(buffer.getvalue()).decode()
-                
-                result['images'].append({
-                    'base64': img_str,
-                    'format': img.format,
-                    'size': img.size,
-                    'mode': img.mode
-                })
-                
                 result['metadata'] = {
                     'width': img.width,
                     'height': img.height,
                     'format': img.format,
                     'mode': img.mode
                 }
+                
+                # Downscale and re-encode before base64 for API calls
+                prepared = prepare_image(img, settings.IMAGE_MAX_SIDE, settings.IMAGE_JPEG_QUALITY)
+                result['images'].append({**prepared, 'mode': img.mode})
         except Exception as e:
             result['error'] = str(e)
         
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict
+import numpy as np
+
+_SQLITE_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC, collapsed whitespace"""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def text_hash(model_name: str, text: str) -> str:
+    """Content hash identifying the embedding of text under a model"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(normalize_text(text).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """Embedding cache keyed by (model name, normalized text hash).
+
+    A bounded in-memory LRU sits in front of a SQLite table on disk, so
+    re-ingested chunks and repeated queries skip the encoder entirely.
+    """
+
+    def __init__(self, model_name: str, path: str = None, max_memory_items: int = 10000):
+        self.model_name = model_name
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self._memory: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)'
+            )
+            self._connection.commit()
+
+    def key(self, text: str) -> str:
+        return text_hash(self.model_name, text)
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for the keys that are present"""
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is None:
+                    missing.append(key)
+                    continue
+                self._memory.move_to_end(key)
+                found[key] = vector
+            self.memory_hits += len(found)
+
+            if missing and self._connection is not None:
+                for start in range(0, len(missing), _SQLITE_BATCH):
+                    batch = missing[start:start + _SQLITE_BATCH]
+                    placeholders = ','.join('?' * len(batch))
+                    rows = self._connection.execute(
+                        f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype='float32')
+                        found[key] = vector
+                        self._remember(key, vector)
+                        self.disk_hits += 1
+
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        """Store freshly computed vectors in both tiers"""
+        vectors = np.asarray(vectors, dtype='float32')
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector.copy())
+            if self._connection is not None:
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)',
+                    [(key, vector.tobytes()) for key, vector in zip(keys, vectors)]
+                )
+                self._connection.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and hit rate since startup"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'memory_items': len(self._memory)
+            }
@@ -0,0 +1,104 @@
+import base64
+import io
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+import numpy as np
+from PIL import Image
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """Difference hash: compares neighbouring pixels of a downscaled grayscale copy.
+
+    Robust to re-encoding, rescaling and small colour shifts, so copies of
+    the same logo or figure land within a few bits of each other.
+    """
+    gray = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash_base64(data: str, hash_size: int = 8) -> Optional[int]:
+    """dHash of a base64 encoded image, or None if it cannot be decoded"""
+    try:
+        with Image.open(io.BytesIO(base64.b64decode(data))) as image:
+            return dhash(image, hash_size)
+    except Exception:
+        return None
+
+
+def _popcount64(values: np.ndarray) -> np.ndarray:
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class ImageAnalysisCache:
+    """Image analyses keyed by perceptual hash, reused for near-duplicate images.
+
+    Entries are scoped to the analysis model and persisted in SQLite; lookups
+    scan the in-memory hash array for the closest entry within max_distance
+    Hamming bits.
+    """
+
+    def __init__(self, model_name: str, path: str = None, max_distance: int = 4):
+        self.model_name = model_name
+        self.max_distance = max_distance
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._analyses = []
+        self._lock = threading.Lock()
+        self._connection = None
+        self.hits = 0
+        self.misses = 0
+
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS image_analyses '
+                '(model TEXT NOT NULL, hash TEXT NOT NULL, analysis TEXT NOT NULL, PRIMARY KEY (model, hash))'
+            )
+            self._connection.commit()
+            rows = self._connection.execute(
+                'SELECT hash, analysis FROM image_analyses WHERE model = ?', (model_name,)
+            ).fetchall()
+            self._hashes = np.array([int(image_hash, 16) for image_hash, _ in rows], dtype=np.uint64)
+            self._analyses = [json.loads(analysis) for _, analysis in rows]
+
+    def get(self, image_hash: int) -> Optional[Dict[str, Any]]:
+        """Analysis of the nearest cached image within max_distance, if any"""
+        with self._lock:
+            if len(self._hashes):
+                distances = _popcount64(self._hashes ^ np.uint64(image_hash))
+                best = int(np.argmin(distances))
+                if distances[best] <= self.max_distance:
+                    self.hits += 1
+                    return dict(self._analyses[best])
+            self.misses += 1
+            return None
+
+    def put(self, image_hash: int, analysis: Dict[str, Any]):
+        with self._lock:
+            self._hashes = np.append(self._hashes, np.uint64(image_hash))
+            self._analyses.append(dict(analysis))
+            if self._connection is not None:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO image_analyses (model, hash, analysis) VALUES (?, ?, ?)',
+                    (self.model_name, f'{image_hash:016x}', json.dumps(analysis))
+                )
+                self._connection.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._analyses)
+            }
@@ -0,0 +1,142 @@
+import base64
+import io
+import tempfile
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Union
+from PIL import Image
+from utils.image_hash_cache import dhash
+
+# Multiple of 3 so base64 blocks concatenate without padding in between
+_BASE64_BLOCK = 3 * 64 * 1024
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+    'GIF': 'image/gif'
+}
+
+
+def _normalize(image: Image.Image, max_side: int) -> Image.Image:
+    """Downscale to max_side and drop metadata, returning a fresh image"""
+    if image.format == 'JPEG':
+        # Let the JPEG decoder skip resolution we are about to throw away
+        image.draft('RGB', (max_side, max_side))
+    if getattr(image, 'n_frames', 1) > 1:
+        image.seek(0)
+    
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    prepared = image.convert('RGBA' if has_alpha else 'RGB')
+    prepared.thumbnail((max_side, max_side), Image.LANCZOS)
+    # EXIF, ICC profiles, text chunks etc. are not needed by the vision model
+    prepared.info = {}
+    return prepared
+
+
+def encode_base64(stream, block_size: int = _BASE64_BLOCK) -> str:
+    """Base64 encode a binary stream block by block"""
+    encoded = io.StringIO()
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        encoded.write(base64.b64encode(block).decode('ascii'))
+    return encoded.getvalue()
+
+
+def prepare_image(image: Image.Image, max_side: int = 1568, jpeg_quality: int = 85) -> Dict[str, Any]:
+    """Downscale, strip and re-encode an image for inline upload to a vision model.
+    
+    Opaque images become JPEG, images with transparency PNG. The encoded
+    bytes are spooled (to disk when large) and base64 encoded in blocks,
+    so the original file, the re-encoded bytes and the base64 text are
+    never all in memory together. 'dhash' is the perceptual hash used by
+    the image analysis cache, taken from the downscaled pixels so the
+    base64 does not have to be decoded again for it.
+    """
+    return _encode_prepared(_normalize(image, max_side), image.size, jpeg_quality)
+
+
+def _encode_prepared(prepared: Image.Image, original_size, jpeg_quality: int) -> Dict[str, Any]:
+    """Encode a normalized image and describe it; the second half of prepare_image"""
+    output_format = 'PNG' if prepared.mode == 'RGBA' else 'JPEG'
+    
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        if output_format == 'JPEG':
+            prepared.save(spool, format='JPEG', quality=jpeg_quality, optimize=True)
+        else:
+            prepared.save(spool, format='PNG', optimize=True)
+        encoded_bytes = spool.tell()
+        spool.seek(0)
+        data = encode_base64(spool)
+    
+    return {
+        'base64': data,
+        'format': output_format,
+        'mime_type': MIME_TYPES[output_format],
+        'size': prepared.size,
+        'original_size': original_size,
+        'encoded_bytes': encoded_bytes,
+        'dhash': dhash(prepared)
+    }
+
+
+class LazyImage(Mapping):
+    """Read-only image entry that decodes and encodes only on demand.
+    
+    Document processors return these in place of eager image dicts. Plain
+    fields (page, width, ...) are available immediately; reading any of the
+    encoded fields ('base64', 'mime_type', ...) calls the loader and runs
+    prepare_image once. The loader returns encoded image bytes or an
+    already decoded PIL image. An image that cannot be decoded has no
+    'base64'.
+    """
+    
+    ENCODED_KEYS = ('base64', 'format', 'mime_type', 'size', 'original_size', 'encoded_bytes', 'dhash')
+    
+    def __init__(self, loader: Callable[[], Union[bytes, Image.Image]], max_side: int = 1568, jpeg_quality: int = 85, **info):
+        self._loader = loader
+        self._max_side = max_side
+        self._jpeg_quality = jpeg_quality
+        self._info = info
+        self._prepared = None
+    
+    def _prepare(self) -> Dict[str, Any]:
+        if self._prepared is None:
+            try:
+                source = self._loader()
+                image = source if isinstance(source, Image.Image) else Image.open(io.BytesIO(source))
+                # The buffer is now only referenced by the image and closing it frees the loader's bytes
+                del source
+                with image:
+                    original_size = image.size
+                    prepared = _normalize(image, self._max_side)
+                # The original is released before the upload copy is encoded
+                self._prepared = _encode_prepared(prepared, original_size, self._jpeg_quality)
+            except Exception as e:
+                print(f"Could not decode embedded image: {e}")
+                self._prepared = {}
+        return self._prepared
+    
+    def release(self):
+        """Drop the encoded payload; it is rebuilt if read again"""
+        self._prepared = None
+    
+    def __getitem__(self, key: str) -> Any:
+        if key in self.ENCODED_KEYS:
+            prepared = self._prepare()
+            if key in prepared:
+                return prepared[key]
+            raise KeyError(key)
+        return self._info[key]
+    
+    def __iter__(self):
+        yield from self._info
+        if self._prepared:
+            yield from self._prepared
+    
+    def __len__(self) -> int:
+        return len(self._info) + len(self._prepared or {})
+    
+    def __repr__(self) -> str:
+        return f"LazyImage({self._info!r}, loaded={self._prepared is not None})"
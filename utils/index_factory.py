@@ -0,0 +1,198 @@
+import time
+from typing import List, Dict, Any, Optional
+import faiss
+import numpy as np
+from config.settings import settings
+
+INDEX_TYPES = ('flat', 'hnsw', 'ivfpq')
+METRICS = ('l2', 'cosine')
+
+
+def factory_string(index_type: str) -> str:
+    """FAISS index_factory description for a configured index type"""
+    if index_type == 'flat':
+        return 'Flat'
+    if index_type == 'hnsw':
+        return f'HNSW{settings.HNSW_M},Flat'
+    if index_type == 'ivfpq':
+        return f'IVF{settings.IVF_NLIST},PQ{settings.PQ_M}x{settings.PQ_NBITS}'
+    raise ValueError(f"Unsupported index type: {index_type}")
+
+
+def faiss_metric(metric: str = None) -> int:
+    """FAISS metric for a configured metric; cosine is inner product over normalized vectors"""
+    metric = metric or settings.INDEX_METRIC
+    if metric == 'l2':
+        return faiss.METRIC_L2
+    if metric == 'cosine':
+        return faiss.METRIC_INNER_PRODUCT
+    raise ValueError(f"Unsupported metric: {metric}")
+
+
+def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length float32 copy of vectors"""
+    vectors = np.array(vectors, dtype='float32', order='C', copy=True)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def requires_training(index_type: str) -> bool:
+    return index_type == 'ivfpq'
+
+
+def training_threshold(index_type: str) -> int:
+    """Number of stored vectors needed before the index can be trained"""
+    if not requires_training(index_type):
+        return 0
+    # FAISS wants ~39 points per centroid and 2^nbits per PQ codebook
+    return max(settings.INDEX_TRAIN_MIN_VECTORS, 39 * settings.IVF_NLIST, 2 ** settings.PQ_NBITS)
+
+
+def create_index(dimension: int, index_type: str = None, id_mapped: bool = False, metric: str = None) -> faiss.Index:
+    """Create an empty, unconfigured index of the requested type.
+
+    With id_mapped vectors are addressed by stable chunk ids instead of
+    insertion position. IVF indexes store ids natively; the others are
+    wrapped in IndexIDMap2, whose remove_ids assumes the Flat layout.
+    """
+    index_type = index_type or settings.INDEX_TYPE
+    index = faiss.index_factory(dimension, factory_string(index_type), faiss_metric(metric))
+    if index_type == 'hnsw':
+        faiss.downcast_index(index).hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+    if id_mapped and index_type != 'ivfpq':
+        index = faiss.IndexIDMap2(index)
+    return index
+
+
+def supports_removal(index_type: str) -> bool:
+    """Whether remove_ids works in place (HNSW graphs must be rebuilt instead)"""
+    return index_type != 'hnsw'
+
+
+def configure_search(index: faiss.Index, index_type: str, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Apply search-time parameters (nprobe / efSearch) for the index type"""
+    if index_type == 'ivfpq':
+        faiss.ParameterSpace().set_index_parameter(index, 'nprobe', nprobe or settings.IVF_NPROBE)
+    elif index_type == 'hnsw':
+        faiss.ParameterSpace().set_index_parameter(index, 'efSearch', ef_search or settings.HNSW_EF_SEARCH)
+
+
+def search_parameters(index_type: str, selector: faiss.IDSelector,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> faiss.SearchParameters:
+    """Per-call search parameters restricting results to ids accepted by selector.
+
+    FAISS requires the parameter class to match the index family, and
+    explicit parameters override the values configured on the index.
+    """
+    if index_type == 'ivfpq':
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe or settings.IVF_NPROBE)
+    if index_type == 'hnsw':
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search or settings.HNSW_EF_SEARCH)
+    return faiss.SearchParameters(sel=selector)
+
+
+def recall_latency_report(vectors: np.ndarray, queries: np.ndarray, k: int = 5,
+                          index_types: List[str] = None, nprobes: List[int] = None,
+                          ef_searches: List[int] = None) -> List[Dict[str, Any]]:
+    """Measure recall@k and per-query latency of each index setting against Flat.
+
+    queries should be held out of vectors: a query that is also in the
+    corpus finds itself first in every index, which inflates recall.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    if settings.INDEX_METRIC == 'cosine':
+        vectors, queries = normalize_vectors(vectors), normalize_vectors(queries)
+    dimension = vectors.shape[1]
+    index_types = index_types or list(INDEX_TYPES)
+    nprobes = nprobes or [1, 4, 16, 64]
+    ef_searches = ef_searches or [16, 32, 64, 128]
+
+    baseline = create_index(dimension, 'flat')
+    baseline.add(vectors)
+    start = time.perf_counter()
+    _, truth = baseline.search(queries, k)
+    flat_latency = (time.perf_counter() - start) / len(queries)
+
+    report = [{
+        'index_type': 'flat', 'setting': '-', 'recall': 1.0,
+        'latency_ms': flat_latency * 1000, 'build_seconds': 0.0
+    }]
+
+    for index_type in index_types:
+        if index_type == 'flat':
+            continue
+        if requires_training(index_type) and len(vectors) < training_threshold(index_type):
+            report.append({'index_type': index_type, 'setting': 'skipped',
+                           'note': f'needs {training_threshold(index_type)} vectors to train'})
+            continue
+
+        start = time.perf_counter()
+        index = create_index(dimension, index_type)
+        if requires_training(index_type):
+            index.train(vectors)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+
+        sweep = [('nprobe', value) for value in nprobes] if index_type == 'ivfpq' else \
+            [('efSearch', value) for value in ef_searches]
+        for name, value in sweep:
+            if name == 'nprobe':
+                configure_search(index, index_type, nprobe=value)
+            else:
+                configure_search(index, index_type, ef_search=value)
+            start = time.perf_counter()
+            _, found = index.search(queries, k)
+            latency = (time.perf_counter() - start) / len(queries)
+            hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+            report.append({
+                'index_type': index_type,
+                'setting': f'{name}={value}',
+                'recall': hits / truth.size,
+                'latency_ms': latency * 1000,
+                'build_seconds': build_seconds
+            })
+
+    return report
+
+
+def format_report(report: List[Dict[str, Any]]) -> str:
+    """Render a recall/latency report as a plain-text table"""
+    lines = [f"{'index':<8} {'setting':<14} {'recall@k':>9} {'ms/query':>10} {'build s':>9}"]
+    for row in report:
+        if 'note' in row:
+            lines.append(f"{row['index_type']:<8} {row['setting']:<14} {row['note']}")
+            continue
+        lines.append(
+            f"{row['index_type']:<8} {row['setting']:<14} {row['recall']:>9.3f} "
+            f"{row['latency_ms']:>10.3f} {row['build_seconds']:>9.2f}"
+        )
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    from utils.segment_store import SegmentStore
+
+    parser = argparse.ArgumentParser(description="Compare ANN index settings against the Flat baseline")
+    parser.add_argument('--queries', type=int, default=500, help="Number of stored vectors held out as queries")
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--synthetic', type=int, default=0, help="Use N random vectors instead of the stored corpus")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        corpus = np.random.default_rng(0).standard_normal((args.synthetic, 384)).astype('float32')
+    else:
+        store = SegmentStore(settings.VECTOR_DB_PATH)
+        parts = [store.load_segment(segment['name']).vectors for segment in store.segments]
+        if not parts:
+            raise SystemExit("Vector store is empty; pass --synthetic N to benchmark random vectors")
+        corpus = np.concatenate(parts)
+
+    if len(corpus) <= args.queries:
+        raise SystemExit(f"Need more than {args.queries} vectors to hold out {args.queries} queries")
+    held_out = np.zeros(len(corpus), dtype=bool)
+    held_out[np.random.default_rng(1).choice(len(corpus), size=args.queries, replace=False)] = True
+    corpus, sample = corpus[~held_out], corpus[held_out]
+    print(f"{len(corpus)} vectors, {len(sample)} held-out queries, k={args.k}")
+    print(format_report(recall_latency_report(corpus, sample, k=args.k)))
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from config.settings import settings
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """Stable hash of a completion request (model, messages, temperature, max_tokens)"""
+    payload = json.dumps(request, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """Completion cache keyed by request_key.
+
+    A bounded in-memory LRU sits in front of a SQLite table on disk; once
+    the disk tier holds more than max_disk_items it drops its least
+    recently used rows, a tenth of the limit at a time. Any object with the same get/put/stats methods can be
+    passed to an agent instead.
+    """
+
+    def __init__(self, path: str = None, max_memory_items: int = 1000, max_disk_items: int = 50000):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self._memory: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._disk_items = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS completions '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)')
+            self._connection.commit()
+            self._disk_items = self._connection.execute('SELECT COUNT(*) FROM completions').fetchone()[0]
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached completion ({'content': ...}) for a request key, if any"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+
+            if self._connection is not None:
+                row = self._connection.execute('SELECT value FROM completions WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._connection.execute('UPDATE completions SET accessed = ? WHERE key = ?', (time.time(), key))
+                    self._connection.commit()
+                    self._remember(key, value)
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store a completion in both tiers"""
+        with self._lock:
+            self._remember(key, value)
+            if self._connection is not None:
+                row = (key, json.dumps(value), time.time())
+                if self._connection.execute(
+                    'INSERT OR IGNORE INTO completions (key, value, accessed) VALUES (?, ?, ?)', row
+                ).rowcount:
+                    self._disk_items += 1
+                else:
+                    self._connection.execute('UPDATE completions SET value = ?, accessed = ? WHERE key = ?',
+                                             (row[1], row[2], key))
+                if self._disk_items > self.max_disk_items:
+                    self._evict()
+                self._connection.commit()
+
+    def _evict(self):
+        """Drop the least recently used disk rows down to 90% of max_disk_items (caller holds the lock)"""
+        excess = self._disk_items - self.max_disk_items * 9 // 10
+        self._disk_items -= self._connection.execute(
+            'DELETE FROM completions WHERE key IN (SELECT key FROM completions ORDER BY accessed LIMIT ?)',
+            (excess,)
+        ).rowcount
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and hit rate since startup"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'memory_items': len(self._memory)
+            }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def shared_llm_cache() -> Optional[LLMCache]:
+    """Process-wide cache configured from settings, or None when disabled"""
+    global _shared_cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = LLMCache(
+                path=os.path.join(os.path.dirname(os.path.abspath(settings.VECTOR_DB_PATH)), "llm_cache.sqlite"),
+                max_memory_items=settings.LLM_CACHE_MEMORY_ITEMS,
+                max_disk_items=settings.LLM_CACHE_DISK_ITEMS
+            )
+        return _shared_cache
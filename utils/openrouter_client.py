@@ -0,0 +1,100 @@
+import asyncio
+import atexit
+import importlib.util
+import threading
+import weakref
+from typing import Dict, Tuple
+import httpx
+import openai
+from config.settings import settings
+
+_clients: Dict[Tuple[str, str], openai.OpenAI] = {}
+# httpx async connections belong to the event loop that opened them, so async pools are per loop
+_async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], openai.AsyncOpenAI]]' = (
+    weakref.WeakKeyDictionary()
+)
+_clients_lock = threading.Lock()
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package"""
+    return settings.HTTP2_ENABLED and importlib.util.find_spec('h2') is not None
+
+
+def _connection_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def _default_timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.HTTP_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
+
+
+def openrouter_client(timeout: float = None, max_retries: int = None) -> openai.OpenAI:
+    """OpenRouter client backed by the process-wide connection pool.
+
+    All callers share one keep-alive httpx pool, so agents reuse warm TLS
+    connections instead of each opening their own. timeout and max_retries
+    are applied per caller with with_options, which copies the client but
+    keeps the pool; failed requests are retried with the SDK's exponential
+    backoff (honoring Retry-After).
+    """
+    key = (settings.OPENROUTER_BASE_URL, settings.OPENROUTER_API_KEY)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = openai.OpenAI(
+                base_url=settings.OPENROUTER_BASE_URL,
+                api_key=settings.OPENROUTER_API_KEY,
+                max_retries=settings.MAX_RETRIES,
+                http_client=openai.DefaultHttpxClient(
+                    limits=_connection_limits(),
+                    timeout=_default_timeout(),
+                    http2=http2_available()
+                )
+            )
+            _clients[key] = client
+    return _with_options(client, timeout, max_retries)
+
+
+def async_openrouter_client(timeout: float = None, max_retries: int = None) -> openai.AsyncOpenAI:
+    """AsyncOpenAI counterpart of openrouter_client, pooled per running event loop"""
+    loop = asyncio.get_running_loop()
+    key = (settings.OPENROUTER_BASE_URL, settings.OPENROUTER_API_KEY)
+    with _clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                base_url=settings.OPENROUTER_BASE_URL,
+                api_key=settings.OPENROUTER_API_KEY,
+                max_retries=settings.MAX_RETRIES,
+                http_client=openai.DefaultAsyncHttpxClient(
+                    limits=_connection_limits(),
+                    timeout=_default_timeout(),
+                    http2=http2_available()
+                )
+            )
+            clients[key] = client
+    return _with_options(client, timeout, max_retries)
+
+
+def _with_options(client, timeout: float = None, max_retries: int = None):
+    options = {}
+    if timeout is not None:
+        options['timeout'] = httpx.Timeout(timeout, connect=settings.HTTP_CONNECT_TIMEOUT)
+    if max_retries is not None:
+        options['max_retries'] = max_retries
+    return client.with_options(**options) if options else client
+
+
+@atexit.register
+def close_clients():
+    """Close the shared connection pools"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
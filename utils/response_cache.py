@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+import numpy as np
+
+
+class ResponseCache:
+    """Answers to earlier questions, reused for paraphrases over the same context.
+
+    A lookup hits when an unexpired entry was retrieved from exactly the same
+    chunk-ID set and its question embedding has a cosine similarity of at
+    least similarity_threshold with the new one. Entries expire after ttl
+    seconds, the least recently used entry is evicted beyond max_entries,
+    and entries built on a changed document are dropped by
+    invalidate_documents.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, ttl: float = 3600.0, max_entries: int = 1000):
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[int, Dict[str, Any]]' = OrderedDict()
+        # Chunk-ID set -> entry keys, so only entries over identical context are compared
+        self._by_context: Dict[FrozenSet[int], List[int]] = {}
+        self._keys = count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, embedding: np.ndarray, chunk_ids: Iterable[int]) -> Optional[Dict[str, Any]]:
+        """Cached result for a question embedding and retrieved chunk IDs, or None"""
+        context = frozenset(chunk_ids)
+        embedding = self._unit(embedding)
+        now = time.monotonic()
+        with self._lock:
+            best_key, best_similarity = None, self.similarity_threshold
+            for key in list(self._by_context.get(context, ())):
+                entry = self._entries[key]
+                if now - entry['created'] > self.ttl:
+                    self._remove(key)
+                    continue
+                similarity = float(np.dot(entry['embedding'], embedding))
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_key)
+            return {**self._entries[best_key]['result'], 'cached': True, 'cache_similarity': best_similarity}
+
+    def store(self, embedding: np.ndarray, chunk_ids: Iterable[int], document_ids: Iterable[str],
+              result: Dict[str, Any]):
+        """Remember the result of a question answered from the given chunks"""
+        context = frozenset(chunk_ids)
+        with self._lock:
+            key = next(self._keys)
+            self._entries[key] = {
+                'embedding': self._unit(embedding),
+                'context': context,
+                'document_ids': frozenset(document_ids),
+                'result': result,
+                'created': time.monotonic()
+            }
+            self._by_context.setdefault(context, []).append(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_documents(self, document_ids: Iterable[str]) -> int:
+        """Drop entries whose answer drew on any of the documents; returns how many"""
+        document_ids = set(document_ids)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry['document_ids'] & document_ids]
+            for key in stale:
+                self._remove(key)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and hit rate since startup"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries)
+            }
+
+    def _remove(self, key: int):
+        entry = self._entries.pop(key)
+        keys = self._by_context[entry['context']]
+        keys.remove(key)
+        if not keys:
+            del self._by_context[entry['context']]
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype='float32').ravel()
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
@@ -0,0 +1,443 @@
+import bisect
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+import faiss
+import numpy as np
+from utils.columnar_store import (
+    ColumnarSegment, SegmentBuilder, write_chunk_ids, write_columnar_segment, write_merged_segment
+)
+
+MANIFEST_VERSION = 1
+
+
+def ids_to_ranges(ids: np.ndarray) -> List[List[int]]:
+    """Compress sorted ids into inclusive [first, last] runs"""
+    if len(ids) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(ids) != 1)
+    starts = np.concatenate([[0], breaks + 1])
+    ends = np.concatenate([breaks, [len(ids) - 1]])
+    return [[int(ids[start]), int(ids[end])] for start, end in zip(starts, ends)]
+
+
+def ranges_to_ids(ranges: List[List[int]]) -> np.ndarray:
+    if not ranges:
+        return np.zeros(0, dtype='int64')
+    return np.concatenate([np.arange(first, last + 1, dtype='int64') for first, last in ranges])
+
+
+def atomic_write(path: str, write_fn, mode: str = 'wb'):
+    """Write a file through a temporary sibling and rename it into place"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, mode) as f:
+            write_fn(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class SegmentStore:
+    """Append-only segments of embeddings and metadata, listed by a manifest.
+
+    Every add writes a new immutable segment directory and then atomically
+    swaps in a manifest that references it, so ingest cost is proportional to
+    the new chunks only and a crash never leaves a half-written segment in use.
+    Chunks carry stable int64 ids; deletes only record tombstoned ids, which
+    compaction later drops from the segments.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.segments_dir = os.path.join(root, 'segments')
+        self.manifest_file = os.path.join(root, 'manifest.json')
+        self._lock = threading.RLock()
+        self._open_segments: Dict[str, ColumnarSegment] = {}
+        self._first_ids = None
+        self._tombstones = None
+        self.manifest = self._load_manifest()
+        self._remove_stale_temp_files()
+        self._remove_orphaned_segments()
+
+    def _remove_stale_temp_files(self):
+        """Delete leftovers of writes interrupted by a crash"""
+        for directory in (self.root, self.segments_dir):
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.listdir(directory):
+                if not entry.startswith('.tmp-'):
+                    continue
+                path = os.path.join(directory, entry)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.unlink(path)
+
+    def _remove_orphaned_segments(self):
+        """Delete segment directories the manifest does not reference.
+        
+        A crash between renaming a segment into place and saving the manifest
+        leaves such a directory behind. The name counter is also moved past
+        every segment name on disk so no name is handed out twice.
+        """
+        if not os.path.isdir(self.segments_dir):
+            return
+        referenced = {segment['name'] for segment in self.manifest['segments']}
+        highest = 0
+        for entry in os.listdir(self.segments_dir):
+            if not entry.startswith('seg-') or not entry[4:].isdigit():
+                continue
+            highest = max(highest, int(entry[4:]))
+            if entry not in referenced:
+                shutil.rmtree(self._segment_path(entry), ignore_errors=True)
+        self.manifest['next_segment'] = max(self.manifest.get('next_segment', 1), highest + 1)
+    
+    def exists(self) -> bool:
+        """Whether a manifest has been written to disk"""
+        return os.path.exists(self.manifest_file)
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        """Load the manifest, or start an empty one"""
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'version': MANIFEST_VERSION, 'next_segment': 1, 'next_chunk_id': 0,
+                'segments': [], 'documents': {}, 'tombstones': []}
+
+    def _save_manifest(self):
+        """Atomically persist the manifest"""
+        self._first_ids = None
+        self._tombstones = None
+        self.manifest['version'] = MANIFEST_VERSION
+        payload = json.dumps(self.manifest, separators=(',', ':'), default=str).encode('utf-8')
+        atomic_write(self.manifest_file, lambda f: f.write(payload))
+
+    @property
+    def segments(self) -> List[Dict[str, Any]]:
+        return list(self.manifest['segments'])
+
+    @property
+    def total_count(self) -> int:
+        """Stored chunks, including tombstoned ones awaiting compaction"""
+        return sum(segment['count'] for segment in self.manifest['segments'])
+
+    @property
+    def live_count(self) -> int:
+        return self.total_count - len(self.tombstones)
+
+    @property
+    def tombstones(self) -> np.ndarray:
+        """Sorted ids of deleted chunks not yet reclaimed"""
+        with self._lock:
+            if self._tombstones is None:
+                self._tombstones = ranges_to_ids(self.manifest.get('tombstones', []))
+            return self._tombstones
+
+    def _segment_path(self, name: str) -> str:
+        return os.path.join(self.segments_dir, name)
+
+    def _staging_dir(self) -> str:
+        """Temporary directory for a segment being written; removed at startup if left behind"""
+        os.makedirs(self.segments_dir, exist_ok=True)
+        return tempfile.mkdtemp(dir=self.segments_dir, prefix='.tmp-')
+
+    def _install_segment(self, tmp_dir: str) -> str:
+        """Rename a fully written staging directory to a fresh segment name"""
+        with self._lock:
+            name = f"seg-{self.manifest['next_segment']:06d}"
+            while os.path.exists(self._segment_path(name)):
+                self.manifest['next_segment'] += 1
+                name = f"seg-{self.manifest['next_segment']:06d}"
+            self.manifest['next_segment'] += 1
+        os.rename(tmp_dir, self._segment_path(name))
+        return name
+
+    def _write_segment(self, write_fn) -> str:
+        """Write a segment to a temporary directory and rename it into place"""
+        tmp_dir = self._staging_dir()
+        try:
+            write_fn(tmp_dir)
+            return self._install_segment(tmp_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def segment_builder(self) -> SegmentBuilder:
+        """Start a segment filled batch by batch; end with finish_segment or discard_segment"""
+        return SegmentBuilder(self._staging_dir())
+
+    def finish_segment(self, builder: SegmentBuilder) -> Dict[str, Any]:
+        """Complete a builder's segment so it can be published; see publish()"""
+        try:
+            builder.finish()
+            name = self._install_segment(builder.path)
+        except BaseException:
+            self.discard_segment(builder)
+            raise
+        return {'name': name, 'count': builder.count}
+
+    def discard_segment(self, builder: SegmentBuilder):
+        builder.close()
+        shutil.rmtree(builder.path, ignore_errors=True)
+
+    def write_segment(self, vectors: np.ndarray, texts: List[str], metadatas: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Persist new chunks as a segment that is not referenced yet; see publish()"""
+        name = self._write_segment(lambda path: write_columnar_segment(path, vectors, texts, metadatas))
+        return {'name': name, 'count': len(texts)}
+
+    def publish(self, staged: List[Dict[str, Any]], documents: Dict[str, Dict[str, Any]] = None,
+                delete_documents: List[str] = None) -> List[np.ndarray]:
+        """Register written segments and document records in one manifest swap.
+
+        Chunk ids are assigned here rather than when the segment is written,
+        so ids grow in publish order: segments stay sorted by id however
+        concurrent writers interleave, and every id up to the newest is
+        published. Documents being superseded are tombstoned in the same
+        swap, before the new segments are added, so a document may supersede
+        its own earlier rows. Returns the ids given to each staged segment.
+        """
+        assigned = []
+        with self._lock:
+            for document_id in delete_documents or []:
+                self._tombstone_document(document_id)
+            for segment in staged:
+                first_id = self.manifest['next_chunk_id']
+                ids = np.arange(first_id, first_id + segment['count'], dtype='int64')
+                write_chunk_ids(self._segment_path(segment['name']), ids)
+                self.manifest['next_chunk_id'] += segment['count']
+                self.manifest['segments'].append({**segment, 'first_id': first_id,
+                                                  'last_id': first_id + segment['count'] - 1})
+                assigned.append(ids)
+            self.manifest.setdefault('documents', {}).update(documents or {})
+            self._save_manifest()
+        return assigned
+
+    def append(self, vectors: np.ndarray, texts: List[str], metadatas: List[Dict[str, Any]],
+               documents: Dict[str, Dict[str, Any]] = None, delete_documents: List[str] = None) -> np.ndarray:
+        """Write and publish one segment; returns the ids assigned to its chunks"""
+        return self.publish([self.write_segment(vectors, texts, metadatas)], documents, delete_documents)[0]
+
+    def register_documents(self, documents: Dict[str, Dict[str, Any]], delete_documents: List[str] = None):
+        """Record documents whose chunks (if any) were published separately"""
+        self.publish([], documents, delete_documents)
+
+    def delete_documents(self, document_ids: List[str]) -> np.ndarray:
+        """Tombstone every chunk of the documents; returns the newly deleted ids"""
+        with self._lock:
+            before = self.tombstones
+            for document_id in document_ids:
+                self._tombstone_document(document_id)
+            self._save_manifest()
+            return np.setdiff1d(self.tombstones, before)
+
+    def delete_chunks(self, ids: np.ndarray):
+        """Tombstone individual chunk ids, e.g. those of an abandoned ingest"""
+        with self._lock:
+            merged = np.union1d(self.tombstones, np.asarray(ids, dtype='int64'))
+            self.manifest['tombstones'] = ids_to_ranges(merged)
+            self._tombstones = merged
+            self._save_manifest()
+
+    def _tombstone_document(self, document_id: str):
+        """Add a document's chunk ids to the tombstones (caller saves the manifest)"""
+        ids = [segment.ids[rows] for segment, rows in self.document_rows(document_id)]
+        self.manifest.get('documents', {}).pop(document_id, None)
+        if not ids:
+            return
+        merged = np.union1d(self.tombstones, np.concatenate(ids))
+        self.manifest['tombstones'] = ids_to_ranges(merged)
+        self._tombstones = merged
+
+    def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        return self.manifest.get('documents', {}).get(document_id)
+
+    @property
+    def documents(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self.manifest.get('documents', {}))
+
+    def document_rows(self, document_id: str):
+        """Yield (segment, local row numbers) holding the chunks of a document"""
+        for segment in self.segments:
+            columnar = self.load_segment(segment['name'])
+            vocabulary = columnar.dictionary('document_id')
+            if document_id not in vocabulary:
+                continue
+            code = vocabulary.index(document_id)
+            rows = np.flatnonzero(columnar.column('document_id') == code)
+            if len(rows):
+                yield columnar, rows
+
+    def filter_rows(self, filters: Dict[str, Any]):
+        """Yield (segment, local rows) of live chunks matching the metadata filters"""
+        tombstones = self.tombstones
+        for segment in self.segments:
+            columnar = self.load_segment(segment['name'])
+            rows = columnar.filter_rows(filters)
+            if len(rows) and len(tombstones):
+                rows = rows[~np.isin(columnar.ids[rows], tombstones)]
+            if len(rows):
+                yield columnar, rows
+
+    def load_segment(self, name: str) -> ColumnarSegment:
+        """Open a memory-mapped view of one segment"""
+        with self._lock:
+            if name not in self._open_segments:
+                self._open_segments[name] = ColumnarSegment(self._segment_path(name))
+            return self._open_segments[name]
+
+    def _dead_count(self, segment: Dict[str, Any], tombstones: np.ndarray) -> int:
+        """Tombstoned chunks of a segment; segment id ranges never overlap"""
+        return int(np.searchsorted(tombstones, segment['last_id'], side='right')
+                   - np.searchsorted(tombstones, segment['first_id'], side='left'))
+    
+    def compaction_plan(self, merge_factor: int = 10, tombstone_ratio: float = 0.2,
+                        purge: bool = False) -> List[List[Dict[str, Any]]]:
+        """Runs of adjacent segments that compact() would rewrite, each into one segment.
+        
+        Segments are tiered by live size in powers of merge_factor, and
+        merge_factor adjacent segments of the same tier are merged, so a
+        chunk is rewritten about once per tier instead of on every
+        compaction. A segment not being merged is rewritten on its own once
+        tombstone_ratio of its chunks are deleted (with purge, once any are).
+        """
+        with self._lock:
+            segments = self.segments
+            tombstones = self.tombstones
+        
+        dead = [self._dead_count(segment, tombstones) for segment in segments]
+        tiers = []
+        for segment, dead_count in zip(segments, dead):
+            live, tier = segment['count'] - dead_count, 0
+            while live >= merge_factor:
+                live //= merge_factor
+                tier += 1
+            tiers.append(tier)
+        
+        merged = set()
+        plan = []
+        start = 0
+        for position in range(1, len(segments) + 1):
+            if position < len(segments) and tiers[position] == tiers[start]:
+                continue
+            for first in range(start, position - merge_factor + 1, merge_factor):
+                plan.append(list(range(first, first + merge_factor)))
+                merged.update(plan[-1])
+            start = position
+        
+        for position, (segment, dead_count) in enumerate(zip(segments, dead)):
+            if position in merged or not dead_count:
+                continue
+            if purge or dead_count >= tombstone_ratio * segment['count']:
+                plan.append([position])
+        
+        plan.sort()
+        return [[segments[position] for position in run] for run in plan]
+    
+    def compact(self, merge_factor: int = 10, tombstone_ratio: float = 0.2,
+                purge: bool = False) -> Optional[np.ndarray]:
+        """Carry out compaction_plan, dropping tombstoned chunks from rewritten segments.
+        
+        Each run is replaced in place by its merged segment, so segments stay
+        in id order, and segments appended meanwhile are kept as they are.
+        Returns the reclaimed chunk ids, or None if there was nothing to do.
+        """
+        plan = self.compaction_plan(merge_factor, tombstone_ratio, purge)
+        if not plan:
+            return None
+        tombstones = self.tombstones
+        
+        replacements = {}
+        reclaimed = []
+        for run in plan:
+            sources = [self.load_segment(segment['name']) for segment in run]
+            keep = [~np.isin(source.ids, tombstones) for source in sources]
+            reclaimed.extend(source.ids[~mask] for source, mask in zip(sources, keep))
+            
+            output = []
+            kept = int(sum(mask.sum() for mask in keep))
+            if kept:
+                name = self._write_segment(lambda path: write_merged_segment(path, sources, keep))
+                kept_ids = [source.ids[mask] for source, mask in zip(sources, keep) if mask.any()]
+                output = [{'name': name, 'count': kept,
+                           'first_id': int(kept_ids[0][0]), 'last_id': int(kept_ids[-1][-1])}]
+            replacements[run[0]['name']] = output
+        reclaimed = np.concatenate(reclaimed)
+        
+        rewritten = {segment['name'] for run in plan for segment in run}
+        with self._lock:
+            segments = []
+            for segment in self.manifest['segments']:
+                if segment['name'] in replacements:
+                    segments.extend(replacements[segment['name']])
+                elif segment['name'] not in rewritten:
+                    segments.append(segment)
+            self.manifest['segments'] = segments
+            self.manifest['tombstones'] = ids_to_ranges(np.setdiff1d(self.tombstones, reclaimed))
+            self._save_manifest()
+        
+        for name in rewritten:
+            self.release_segment(name)
+            shutil.rmtree(self._segment_path(name), ignore_errors=True)
+        return reclaimed
+    
+    def save_index_snapshot(self, index: faiss.Index, max_id: int, index_type: str):
+        """Persist a trained/built index that contains every chunk up to max_id"""
+        file_name = f'index-{index_type}.faiss'
+        path = os.path.join(self.root, file_name)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-', suffix=file_name)
+        os.close(fd)
+        try:
+            faiss.write_index(index, tmp_path)
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self.manifest['index'] = {'file': file_name, 'index_type': index_type, 'max_id': max_id}
+            self._save_manifest()
+
+    def load_index_snapshot(self, index_type: str) -> Optional[Tuple[faiss.Index, int]]:
+        """Load the persisted index and the highest chunk id it contains"""
+        snapshot = self.manifest.get('index')
+        if not snapshot or snapshot['index_type'] != index_type or 'max_id' not in snapshot:
+            return None
+        path = os.path.join(self.root, snapshot['file'])
+        if not os.path.exists(path) or snapshot['max_id'] >= self.manifest['next_chunk_id']:
+            return None
+        return faiss.read_index(path), snapshot['max_id']
+
+    def release_segment(self, name: str):
+        """Forget an open segment; its mappings close once readers drop them"""
+        with self._lock:
+            self._open_segments.pop(name, None)
+
+    def locate(self, chunk_id: int) -> Optional[Tuple[ColumnarSegment, int]]:
+        """Map a chunk id to its segment and local row"""
+        with self._lock:
+            if self._first_ids is None:
+                self._first_ids = [segment['first_id'] for segment in self.manifest['segments']]
+            position = bisect.bisect_right(self._first_ids, chunk_id) - 1
+            if position < 0:
+                return None
+            segment = self.manifest['segments'][position]
+            if chunk_id > segment['last_id']:
+                return None
+            columnar = self.load_segment(segment['name'])
+        row = int(np.searchsorted(columnar.ids, chunk_id))
+        if row >= len(columnar) or columnar.ids[row] != chunk_id:
+            return None
+        return columnar, row
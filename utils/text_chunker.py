@@ -0,0 +1,134 @@
+import re
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+from config.settings import settings
+
+_WORD_PATTERN = re.compile(r'\S+')
+
+
+class TextChunker:
+    """Split extracted text into token-bounded, overlapping chunks"""
+
+    def __init__(self, tokenizer=None, chunk_size: int = None, chunk_overlap: int = None, max_tokens: int = None):
+        self.tokenizer = tokenizer
+        chunk_size = chunk_size or settings.CHUNK_SIZE
+        if chunk_overlap is None:
+            chunk_overlap = settings.CHUNK_OVERLAP
+
+        # Never produce chunks the embedding model would silently truncate
+        if max_tokens:
+            chunk_size = min(chunk_size, max_tokens)
+
+        self.chunk_size = max(chunk_size, 1)
+        self.chunk_overlap = min(max(chunk_overlap, 0), self.chunk_size // 2)
+        self._use_offsets = bool(tokenizer is not None and getattr(tokenizer, 'is_fast', False))
+
+    @classmethod
+    def for_model(cls, embedding_model) -> 'TextChunker':
+        """Create a chunker that measures size with the embedding model's tokenizer"""
+        tokenizer = getattr(embedding_model, 'tokenizer', None)
+        max_seq_length = getattr(embedding_model, 'max_seq_length', None)
+        # Leave room for the [CLS]/[SEP] special tokens added at encode time
+        max_tokens = max_seq_length - 2 if max_seq_length else None
+        return cls(tokenizer=tokenizer, max_tokens=max_tokens)
+
+    def _token_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Return (start, end) character offsets of every token in text"""
+        if self._use_offsets:
+            encoding = self.tokenizer(
+                text,
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+                verbose=False
+            )
+            return [(start, end) for start, end in encoding['offset_mapping'] if end > start]
+
+        # Fallback for slow tokenizers: approximate tokens with whitespace-separated words
+        return [match.span() for match in _WORD_PATTERN.finditer(text)]
+
+    def chunk(self, text_content: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Stream chunks from extracted text units, preserving page/paragraph provenance.
+
+        Consecutive small units are packed together until the token budget is
+        reached; large units are split into overlapping windows. Each unit is
+        tokenized once and chunk text is sliced from the source only when a
+        chunk is emitted, so the total work is linear in the input size.
+        """
+        window: List[Tuple[Dict[str, Any], int, int]] = []  # (unit, token start, token end)
+        window_tokens = 0
+        fresh_tokens = 0  # tokens not yet emitted in any chunk
+        spans_by_unit: Dict[int, List[Tuple[int, int]]] = {}
+
+        for unit in text_content:
+            text = unit.get('content', '')
+            if not text or not text.strip():
+                continue
+
+            spans = self._token_spans(text)
+            if not spans:
+                continue
+            spans_by_unit[id(unit)] = spans
+
+            position = 0
+            while position < len(spans):
+                take = min(self.chunk_size - window_tokens, len(spans) - position)
+                if window and window[-1][0] is unit and window[-1][2] == position:
+                    window[-1] = (unit, window[-1][1], position + take)
+                else:
+                    window.append((unit, position, position + take))
+                window_tokens += take
+                fresh_tokens += take
+                position += take
+
+                if window_tokens >= self.chunk_size:
+                    yield self._build_chunk(window, spans_by_unit, window_tokens)
+                    window, window_tokens = self._carry_overlap(window)
+                    fresh_tokens = 0
+                    # Drop span lists no longer referenced by the window
+                    live = {id(entry[0]) for entry in window}
+                    live.add(id(unit))
+                    for key in list(spans_by_unit):
+                        if key not in live:
+                            del spans_by_unit[key]
+
+        # Emit the tail unless it is only the overlap of an already emitted chunk
+        if fresh_tokens:
+            yield self._build_chunk(window, spans_by_unit, window_tokens)
+
+    def _carry_overlap(self, window: List[Tuple[Dict[str, Any], int, int]]) -> Tuple[list, int]:
+        """Keep the last chunk_overlap tokens of the window for the next chunk"""
+        remaining = self.chunk_overlap
+        carried = []
+        for unit, start, end in reversed(window):
+            if remaining <= 0:
+                break
+            take = min(remaining, end - start)
+            carried.append((unit, end - take, end))
+            remaining -= take
+        carried.reverse()
+        return carried, self.chunk_overlap - remaining
+
+    def _build_chunk(self, window, spans_by_unit, token_count: int) -> Dict[str, Any]:
+        """Materialize chunk text and provenance from the token window"""
+        parts = []
+        for unit, start, end in window:
+            spans = spans_by_unit[id(unit)]
+            parts.append(unit['content'][spans[start][0]:spans[end - 1][1]])
+        content = '\n'.join(parts)
+
+        first_unit, first_start, _ = window[0]
+        last_unit = window[-1][0]
+        first_spans = spans_by_unit[id(first_unit)]
+        chunk = {
+            'content': content,
+            'page': first_unit.get('page'),
+            'paragraph': first_unit.get('paragraph'),
+            'char_start': first_spans[first_start][0],
+            'char_count': len(content),
+            'token_count': token_count
+        }
+        if last_unit is not first_unit:
+            chunk['page_end'] = last_unit.get('page')
+            chunk['paragraph_end'] = last_unit.get('paragraph')
+        return chunk
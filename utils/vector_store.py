@@ -1,48 +1,306 @@
 import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import pickle
 import os
+import threading
 from config.settings import settings
+from utils.segment_store import SegmentStore
+from utils.rwlock import ReadWriteLock
+from utils.embedding_cache import EmbeddingCache, text_hash
+from utils.embedding_engine import EmbeddingEngine
+from utils.index_factory import (
+    create_index, configure_search, faiss_metric, normalize_vectors, search_parameters,
+    requires_training, supports_removal, training_threshold
+)
 
 class VectorStore:
     def __init__(self):
         self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
         self.dimension = 384  # MiniLM dimension
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.texts = []
-        self.metadatas = []
+        self.embedding_engine = EmbeddingEngine(
+            self.embedding_model,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            processes=settings.EMBEDDING_PROCESSES,
+            pool_min_texts=settings.EMBEDDING_POOL_MIN_TEXTS
+        )
+        self.embedding_cache = None
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                settings.EMBEDDING_MODEL,
+                path=os.path.join(os.path.dirname(os.path.abspath(settings.VECTOR_DB_PATH)), "embedding_cache.sqlite"),
+                max_memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS
+            )
+        self.index_type = settings.INDEX_TYPE
+        self.metric = settings.INDEX_METRIC
+        self.active_index_type = None
+        self.index = None
+        self.search_settings = {'nprobe': None, 'ef_search': None}
+        # Searches share the index; adds, removals and swaps take it exclusively
+        self._index_lock = ReadWriteLock()
+        # Serializes publishing so chunks reach the index in id order
+        self._publish_lock = threading.Lock()
+        self._tombstone_filter = None
+        # Highest chunk id added to the index; every published id up to it is indexed
+        self._indexed_through = -1
+        self.segment_store = SegmentStore(settings.VECTOR_DB_PATH)
+        # Pre-segment single-file format, migrated on first load
         self.index_file = os.path.join(settings.VECTOR_DB_PATH, "faiss_index.bin")
         self.metadata_file = os.path.join(settings.VECTOR_DB_PATH, "metadata.pkl")
+        self._compaction_thread = None
+        # Reentrant: compaction rebuilds indexes that cannot remove ids
+        self._compaction_lock = threading.RLock()
         self._load_index()
     
     def _load_index(self):
         """Load existing index if available"""
         try:
-            if os.path.exists(self.index_file):
-                self.index = faiss.read_index(self.index_file)
-            if os.path.exists(self.metadata_file):
-                with open(self.metadata_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.texts = data.get('texts', [])
-                    self.metadatas = data.get('metadatas', [])
+            if not self.segment_store.exists() and os.path.exists(self.metadata_file):
+                self._migrate_legacy_index()
+            
+            indexed_through = -1
+            snapshot = self.segment_store.load_index_snapshot(self.index_type)
+            # A snapshot built for another metric is rebuilt from the stored vectors
+            if snapshot is not None and snapshot[0].metric_type == faiss_metric(self.metric):
+                self.index, indexed_through = snapshot
+                self.active_index_type = self.index_type
+                self._configure_search()
+            else:
+                self._reset_index()
+            
+            # Only vectors are read eagerly; texts and metadata stay memory-mapped
+            added = 0
+            for vectors, ids in self._iter_stored_vectors(after_id=indexed_through):
+                self.index.add_with_ids(vectors, ids)
+                added += len(ids)
+                indexed_through = int(ids[-1])
+            self._indexed_through = indexed_through
+            self._refresh_tombstone_filter()
+            
+            if not self._maybe_train() and self.active_index_type != 'flat' and added:
+                self.save_index_snapshot()
         except Exception as e:
             print(f"Could not load existing index: {e}")
+            self._reset_index()
     
-    def _save_index(self):
-        """Save index and metadata"""
-        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
-        faiss.write_index(self.index, self.index_file)
-        with open(self.metadata_file, 'wb') as f:
-            pickle.dump({'texts': self.texts, 'metadatas': self.metadatas}, f)
+    def _reset_index(self):
+        """Start an empty index; types that need training stage vectors in Flat first"""
+        self.active_index_type = 'flat' if requires_training(self.index_type) else self.index_type
+        self.index = create_index(self.dimension, self.active_index_type, id_mapped=True, metric=self.metric)
+        self._indexed_through = -1
+        self._configure_search()
     
-    def add_document_chunks(self, chunks: List[Dict[str, Any]], document_id: str):
+    def _configure_search(self):
+        configure_search(self.index, self.active_index_type,
+                         nprobe=self.search_settings['nprobe'], ef_search=self.search_settings['ef_search'])
+    
+    def _iter_stored_vectors(self, after_id: int = -1):
+        """Yield (embeddings, chunk ids) of live chunks with id > after_id, segment by segment"""
+        tombstones = self.segment_store.tombstones
+        for segment in self.segment_store.segments:
+            if segment['last_id'] <= after_id:
+                continue
+            columnar = self.segment_store.load_segment(segment['name'])
+            ids = np.asarray(columnar.ids)
+            mask = ids > after_id
+            if len(tombstones):
+                mask &= ~np.isin(ids, tombstones)
+            if mask.any():
+                yield self._prepare_vectors(columnar.vectors[mask]), ids[mask]
+    
+    def _sample_stored_vectors(self, size: int) -> np.ndarray:
+        """Uniform sample of persisted embeddings, used to train quantizers"""
+        total = self.segment_store.total_count
+        if total <= size:
+            return np.concatenate([vectors for vectors, _ in self._iter_stored_vectors()])
+        rows = np.sort(np.random.default_rng(0).choice(total, size=size, replace=False))
+        sample = []
+        position = 0
+        for segment in self.segment_store.segments:
+            count = segment['count']
+            local = rows[(rows >= position) & (rows < position + count)] - position
+            if len(local):
+                columnar = self.segment_store.load_segment(segment['name'])
+                sample.append(self._prepare_vectors(columnar.vectors[local]))
+            position += count
+        return np.concatenate(sample)
+    
+    def _prepare_vectors(self, vectors: np.ndarray) -> np.ndarray:
+        """Vectors as the index expects them: unit length in cosine mode"""
+        if self.metric == 'cosine':
+            return normalize_vectors(vectors)
+        return np.ascontiguousarray(vectors, dtype='float32')
+    
+    def _refresh_tombstone_filter(self):
+        """Rebuild the selector that hides deleted chunks from search results"""
+        tombstones = self.segment_store.tombstones
+        if not len(tombstones):
+            self._tombstone_filter = None
+            return
+        # Keep the inner selector referenced; IDSelectorNot does not own it
+        deleted = faiss.IDSelectorBatch(tombstones)
+        self._tombstone_filter = (faiss.IDSelectorNot(deleted), deleted)
+    
+    def _maybe_train(self) -> bool:
+        """Switch from the Flat staging index once enough vectors exist to train"""
+        if self.active_index_type == self.index_type:
+            return False
+        if self.index.ntotal < training_threshold(self.index_type):
+            return False
+        self.rebuild_index()
+        return True
+    
+    def rebuild_index(self, index_type: str = None):
+        """Build (and train if needed) a fresh index from the stored embeddings.
+        
+        Building happens outside the index lock. Chunks are published and
+        indexed under the publish lock (see _publish), so the catch-up and
+        swap below hold it too: every chunk published meanwhile is added
+        exactly once, either here or by its writer after the swap. Tombstoned chunks
+        are left out, and compaction waits so segments being read are not
+        rewritten underneath the build.
+        """
+        with self._compaction_lock:
+            index_type = index_type or self.index_type
+            index = create_index(self.dimension, index_type, id_mapped=True, metric=self.metric)
+            if requires_training(index_type):
+                index.train(self._sample_stored_vectors(settings.INDEX_TRAIN_SAMPLE_SIZE))
+            
+            built_through = -1
+            for vectors, ids in self._iter_stored_vectors():
+                index.add_with_ids(vectors, ids)
+                built_through = max(built_through, int(ids[-1]))
+            
+            with self._publish_lock, self._index_lock.write():
+                for vectors, ids in self._iter_stored_vectors(after_id=built_through):
+                    index.add_with_ids(vectors, ids)
+                self._indexed_through = self.segment_store.manifest['next_chunk_id'] - 1
+                self.index_type = index_type
+                self.index = index
+                self.active_index_type = index_type
+                self._configure_search()
+        if index_type != 'flat':
+            self.save_index_snapshot()
+    
+    def save_index_snapshot(self):
+        """Persist the current index so startup does not rebuild it"""
+        with self._index_lock.read():
+            self.segment_store.save_index_snapshot(self.index, self._indexed_through, self.active_index_type)
+    
+    def set_search_params(self, nprobe: int = None, ef_search: int = None):
+        """Tune recall/latency of the active index (IVF nprobe, HNSW efSearch)"""
+        with self._index_lock.write():
+            self.search_settings = {'nprobe': nprobe, 'ef_search': ef_search}
+            self._configure_search()
+    
+    def _migrate_legacy_index(self):
+        """Convert faiss_index.bin/metadata.pkl into the first segment"""
+        with open(self.metadata_file, 'rb') as f:
+            data = pickle.load(f)
+        texts = data.get('texts', [])
+        metadatas = data.get('metadatas', [])
+        
+        vectors = np.zeros((0, self.dimension), dtype='float32')
+        if texts and os.path.exists(self.index_file):
+            legacy_index = faiss.read_index(self.index_file)
+            vectors = legacy_index.reconstruct_n(0, legacy_index.ntotal)
+        
+        if len(vectors) != len(texts):
+            raise ValueError("Legacy index and metadata are out of sync; not migrating")
+        
+        # The legacy store kept no document records; rebuild them from the chunk metadata
+        documents = {}
+        for metadata in metadatas:
+            document_id = metadata.get('document_id')
+            if document_id is None:
+                continue
+            info = documents.setdefault(document_id, {'chunks': 0, 'has_images': False, 'migrated': True})
+            info['chunks'] += 1
+            info['has_images'] = info['has_images'] or bool(metadata.get('has_images'))
+        
+        if texts:
+            self.segment_store.append(vectors, texts, metadatas, documents)
+    
+    def _maybe_compact(self):
+        """Schedule background compaction when similar-sized segments or tombstones pile up"""
+        if not settings.AUTO_COMPACT:
+            return
+        if self.segment_store.compaction_plan(settings.SEGMENT_MERGE_FACTOR, settings.TOMBSTONE_COMPACTION_RATIO):
+            self.compact(background=True, purge=False)
+    
+    def compact(self, background: bool = False, purge: bool = True):
+        """Merge on-disk segments and reclaim deleted chunks, optionally in a background thread.
+        
+        With purge every tombstoned chunk is reclaimed; otherwise only
+        segments past TOMBSTONE_COMPACTION_RATIO are rewritten. A synchronous
+        call waits for a background compaction in progress and then runs its
+        own, so it returns only once the store is compacted.
+        """
+        if not background:
+            self._compact(purge)
+            return
+        
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self._compact_quietly, args=(purge,), daemon=True)
+        self._compaction_thread.start()
+    
+    def _compact(self, purge: bool = True):
+        with self._compaction_lock:
+            self._compact_locked(purge)
+    
+    def _compact_locked(self, purge: bool):
+        reclaimed = self.segment_store.compact(settings.SEGMENT_MERGE_FACTOR, settings.TOMBSTONE_COMPACTION_RATIO,
+                                               purge=purge)
+        if reclaimed is None or not len(reclaimed):
+            return
+        
+        # Drop reclaimed chunks from the live index before they stop being filtered
+        if supports_removal(self.active_index_type):
+            with self._index_lock.write():
+                self.index.remove_ids(faiss.IDSelectorBatch(reclaimed))
+            if self.active_index_type != 'flat':
+                self.save_index_snapshot()
+        else:
+            self.rebuild_index(self.active_index_type)
+        self._refresh_tombstone_filter()
+    
+    def _compact_quietly(self, purge: bool):
+        try:
+            self._compact(purge)
+        except Exception as e:
+            print(f"Segment compaction failed: {e}")
+    
+    def add_document_chunks(self, chunks: List[Dict[str, Any]], document_id: str,
+                            document_info: Dict[str, Any] = None):
         """Add document chunks to vector store"""
-        texts = [chunk['content'] for chunk in chunks]
+        self._add_chunks(chunks, document_id, document_info)
+    
+    def replace_document(self, old_document_id: str, chunks: List[Dict[str, Any]], document_id: str,
+                         document_info: Dict[str, Any] = None):
+        """Index a new version of a document and tombstone the old one in a single manifest swap.
+        
+        Chunks whose text is unchanged reuse the old version's vectors
+        instead of being re-embedded.
+        """
+        self._add_chunks(chunks, document_id, document_info, replaces=old_document_id)
+    
+    def delete_document(self, document_id: str) -> int:
+        """Remove a document from search results; storage is reclaimed by compaction"""
+        deleted = self.segment_store.delete_documents([document_id])
+        self._refresh_tombstone_filter()
+        self._maybe_compact()
+        return len(deleted)
+    
+    def document_writer(self, document_id: str, replaces: str = None) -> 'DocumentWriter':
+        """Incremental writer for ingesting a document batch by batch"""
+        return DocumentWriter(self, document_id, replaces)
+    
+    def _chunk_metadatas(self, chunks: List[Dict[str, Any]], document_id: str, start_index: int = 0) -> List[Dict[str, Any]]:
         metadatas = []
         
-        for i, chunk in enumerate(chunks):
+        for i, chunk in enumerate(chunks, start_index):
             metadatas.append({
                 'document_id': document_id,
                 'chunk_index': i,
@@ -52,36 +310,286 @@ class VectorStore:
                 'has_images': chunk.get('has_images', False),
                 'confidence': chunk.get('confidence', 1.0)
             })
+        return metadatas
+    
+    def _add_chunks(self, chunks: List[Dict[str, Any]], document_id: str,
+                    document_info: Dict[str, Any] = None, replaces: str = None):
+        texts = [chunk['content'] for chunk in chunks]
+        metadatas = self._chunk_metadatas(chunks, document_id)
+        
+        documents = {document_id: {**(document_info or {}), 'chunks': len(texts)}}
+        delete_documents = self._superseded(document_id, replaces)
+        if not texts:
+            self._publish([], documents, delete_documents)
+            return
         
         # Generate embeddings
-        embeddings = self.embedding_model.encode(texts)
+        known = self._stored_rows(*delete_documents) if delete_documents else None
+        embeddings = self._encode(texts, known=known)
         
-        # Add to FAISS index
-        self.index.add(embeddings.astype('float32'))
-        self.texts.extend(texts)
-        self.metadatas.extend(metadatas)
+        # Persist only the new chunks, then publish them and make them searchable together
+        staged = self.segment_store.write_segment(embeddings, texts, metadatas)
+        self._publish([staged], documents, delete_documents)
+        if not self._maybe_train():
+            self._maybe_compact()
+    
+    def _publish(self, staged: List[Dict[str, Any]], documents: Dict[str, Dict[str, Any]] = None,
+                 delete_documents: List[str] = None) -> List[np.ndarray]:
+        """Publish written segments and add their vectors to the index in one step.
         
-        # Save index
-        self._save_index()
+        Publishes are serialized by the publish lock, so ids are indexed in
+        the order they are assigned: _indexed_through is exact, and a rebuild
+        catching up under the same lock cannot add a chunk its writer adds
+        again. Searches are only held off while the vectors are added and a
+        superseded document's tombstones take effect, not for the manifest
+        write or while the vectors are read back.
+        """
+        with self._publish_lock:
+            assigned = self.segment_store.publish(staged, documents, delete_documents)
+            batches = []
+            for segment, ids in zip(staged, assigned):
+                vectors = self.segment_store.load_segment(segment['name']).vectors
+                for start in range(0, len(ids), settings.INGEST_BATCH_SIZE):
+                    end = start + settings.INGEST_BATCH_SIZE
+                    batches.append((self._prepare_vectors(vectors[start:end]), ids[start:end]))
+            
+            with self._index_lock.write():
+                for vectors, ids in batches:
+                    self.index.add_with_ids(vectors, ids)
+                    self._indexed_through = int(ids[-1])
+                if delete_documents:
+                    self._refresh_tombstone_filter()
+        return assigned
+    
+    def has_document(self, document_id: str) -> bool:
+        return self.segment_store.get_document(document_id) is not None
+    
+    def get_document(self, document_id: str) -> Dict[str, Any]:
+        return self.segment_store.get_document(document_id)
+    
+    def find_document_by_source(self, source: str):
+        """Latest registered document id ingested from the given source name"""
+        for document_id, info in reversed(list(self.segment_store.documents.items())):
+            if info.get('source') == source:
+                return document_id
+        return None
+    
+    def _superseded(self, document_id: str, replaces: str = None) -> List[str]:
+        """Documents whose chunks a new ingest of document_id tombstones.
+        
+        Besides the replaced document, that is any earlier ingest under the
+        same id, e.g. one registered with an error and now retried.
+        """
+        superseded = [replaces] if replaces and replaces != document_id else []
+        if self.has_document(document_id):
+            superseded.append(document_id)
+        return superseded
+    
+    def _stored_rows(self, *document_ids: str) -> Dict[str, Tuple[np.ndarray, int]]:
+        """Memory-mapped vectors and row of each stored chunk of the documents, keyed by content hash.
+        
+        Nothing is copied up front; _encode reads only the rows a batch reuses.
+        """
+        rows_by_hash = {}
+        for document_id in document_ids:
+            for segment, rows in self.segment_store.document_rows(document_id):
+                vectors = segment.vectors
+                for row in rows:
+                    rows_by_hash[text_hash(settings.EMBEDDING_MODEL, segment.text(row))] = (vectors, int(row))
+        return rows_by_hash
+    
+    def _encode(self, texts: List[str], known: Dict[str, Tuple[np.ndarray, int]] = None) -> np.ndarray:
+        """Embed texts, reusing known stored rows or cached vectors and encoding each distinct miss once"""
+        keys = [text_hash(settings.EMBEDDING_MODEL, text) for text in texts]
+        found = {}
+        for key in keys:
+            if known and key in known and key not in found:
+                vectors, row = known[key]
+                found[key] = np.asarray(vectors[row], dtype='float32')
+        
+        if self.embedding_cache is not None:
+            lookup = [key for key in dict.fromkeys(keys) if key not in found]
+            found.update(self.embedding_cache.get_many(lookup))
+        
+        pending: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+        
+        if pending:
+            encoded = self.embedding_engine.encode(list(pending.values()))
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many(list(pending), encoded)
+            found.update(zip(pending, encoded))
+        
+        return self._prepare_vectors(np.stack([found[key] for key in keys]))
+    
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Query embeddings as used for search (cached, normalized in cosine mode)"""
+        return self._encode(queries)
+    
+    def embedding_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the embedding cache"""
+        return self.embedding_cache.stats() if self.embedding_cache is not None else {}
+    
+    @property
+    def total_chunks(self) -> int:
+        """Searchable chunks, excluding tombstones"""
+        return self.segment_store.live_count
+    
+    def _materialize(self, chunk_id: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Decode text and metadata for a single search hit"""
+        location = self.segment_store.locate(int(chunk_id))
+        if location is None:
+            return None
+        segment, row = location
+        return segment.text(row), segment.metadata(row)
     
-    def similarity_search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+    def similarity_search(self, query: str, k: int = 5, min_score: float = None,
+                          filters: Dict[str, Any] = None, query_embedding: np.ndarray = None) -> List[Dict[str, Any]]:
         """Perform similarity search"""
-        if len(self.texts) == 0:
-            return []
+        return self.similarity_search_batch(
+            [query], k=k, min_score=min_score, filters=filters,
+            query_embeddings=None if query_embedding is None else query_embedding[None, :]
+        )[0]
+    
+    def similarity_search_batch(self, queries: List[str], k: int = 5, min_score: float = None,
+                                filters: Dict[str, Any] = None,
+                                query_embeddings: np.ndarray = None) -> List[List[Dict[str, Any]]]:
+        """Search many queries with one batched encode and one FAISS search.
+        
+        Hits with a relevance_score below min_score are dropped. In cosine
+        mode the score is the cosine similarity, so one threshold means the
+        same thing for every query. filters restricts the search to chunks
+        whose metadata match (see ColumnarSegment.filter_rows). Callers that
+        already hold embed_queries(queries) pass it as query_embeddings.
+        """
+        total = self.index.ntotal
+        if total == 0 or not queries:
+            return [[] for _ in queries]
+        
+        if query_embeddings is None:
+            query_embeddings = self._encode(queries)
         
-        query_embedding = self.embedding_model.encode([query]).astype('float32')
+        if filters:
+            distances, indices = self._filtered_search(query_embeddings, k, filters)
+        else:
+            distances, indices = self._search(query_embeddings, k)
         
-        # Search
-        distances, indices = self.index.search(query_embedding, min(k, len(self.texts)))
+        return [self._build_results(row_scores, row_indices, min_score)
+                for row_scores, row_indices in zip(distances, indices)]
+    
+    def _search(self, query_embeddings: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k over the whole index"""
+        # Search; pending tombstones are skipped inside FAISS via an id selector
+        with self._index_lock.read():
+            params = None
+            if self._tombstone_filter is not None:
+                params = search_parameters(self.active_index_type, self._tombstone_filter[0],
+                                           nprobe=self.search_settings['nprobe'],
+                                           ef_search=self.search_settings['ef_search'])
+            return self.index.search(query_embeddings, min(k, self.index.ntotal), params=params)
+    
+    def _filtered_search(self, query_embeddings: np.ndarray, k: int,
+                         filters: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k restricted to chunks matching filters, at a cost proportional to the subset.
         
+        Small subsets are searched exactly over their own vectors; large ones
+        go through the ANN index with an id selector for the subset.
+        """
+        matches = list(self.segment_store.filter_rows(filters))
+        count = sum(len(rows) for _, rows in matches)
+        if count == 0:
+            empty = np.zeros((len(query_embeddings), 0))
+            return empty, empty.astype('int64')
+        
+        ids = np.concatenate([np.asarray(segment.ids[rows]) for segment, rows in matches])
+        if count > settings.FILTER_BRUTE_FORCE_MAX:
+            selector = faiss.IDSelectorBatch(ids)
+            with self._index_lock.read():
+                params = search_parameters(self.active_index_type, selector,
+                                           nprobe=self.search_settings['nprobe'],
+                                           ef_search=self.search_settings['ef_search'])
+                return self.index.search(query_embeddings, min(k, count), params=params)
+        
+        vectors = self._prepare_vectors(np.concatenate([segment.vectors[rows] for segment, rows in matches]))
+        subset = faiss.IndexFlat(self.dimension, faiss_metric(self.metric))
+        subset.add(vectors)
+        distances, positions = subset.search(query_embeddings, min(k, count))
+        return distances, np.where(positions >= 0, ids[positions], -1)
+    
+    def _build_results(self, scores: np.ndarray, indices: np.ndarray, min_score: float = None) -> List[Dict[str, Any]]:
+        """Materialize the hits of a single query"""
         results = []
-        for distance, idx in zip(distances[0], indices[0]):
-            if idx < len(self.texts) and idx >= 0:
+        for score, idx in zip(scores, indices):
+            if self.metric == 'cosine':
+                relevance, distance = float(score), 1.0 - float(score)
+            else:
+                relevance, distance = 1 / (1 + float(score)), float(score)
+            if min_score is not None and relevance < min_score:
+                continue
+            hit = self._materialize(idx) if idx >= 0 else None
+            if hit is not None:
+                content, metadata = hit
                 results.append({
-                    'content': self.texts[idx],
-                    'metadata': self.metadatas[idx],
-                    'distance': float(distance),
-                    'relevance_score': 1 / (1 + float(distance))
+                    'chunk_id': int(idx),
+                    'content': content,
+                    'metadata': metadata,
+                    'distance': distance,
+                    'relevance_score': relevance
                 })
         
         return results
+
+
+class DocumentWriter:
+    """Streams one document's chunks into a single new segment in batches.
+    
+    write() only stages batches on disk, so nothing of the document is
+    searchable until commit() publishes the segment, registers the
+    document and tombstones the version it replaces (and any rows already
+    stored under its own id) in one step. abort() discards the staged
+    batches.
+    """
+    
+    def __init__(self, store: VectorStore, document_id: str, replaces: str = None):
+        self.store = store
+        self.document_id = document_id
+        self.replaces = replaces if replaces != document_id else None
+        self.chunk_count = 0
+        self._builder = None
+        self._known = None
+    
+    def encode(self, chunks: List[Dict[str, Any]]) -> np.ndarray:
+        """Embed a batch, reusing vectors of the superseded version where text is unchanged"""
+        if self._known is None:
+            self._known = self.store._stored_rows(*self.store._superseded(self.document_id, self.replaces))
+        return self.store._encode([chunk['content'] for chunk in chunks], known=self._known)
+    
+    def write(self, chunks: List[Dict[str, Any]], embeddings: np.ndarray):
+        """Stage an encoded batch in the document's segment"""
+        if not chunks:
+            return
+        if self._builder is None:
+            self._builder = self.store.segment_store.segment_builder()
+        texts = [chunk['content'] for chunk in chunks]
+        metadatas = self.store._chunk_metadatas(chunks, self.document_id, start_index=self.chunk_count)
+        self._builder.add(embeddings, texts, metadatas)
+        self.chunk_count += len(chunks)
+    
+    def commit(self, document_info: Dict[str, Any] = None):
+        """Publish the staged segment and make it searchable"""
+        documents = {self.document_id: {**(document_info or {}), 'chunks': self.chunk_count}}
+        delete_documents = self.store._superseded(self.document_id, self.replaces)
+        staged = []
+        if self._builder is not None:
+            builder, self._builder = self._builder, None
+            staged.append(self.store.segment_store.finish_segment(builder))
+        self.store._publish(staged, documents, delete_documents)
+        if not self.store._maybe_train():
+            self.store._maybe_compact()
+    
+    def abort(self):
+        if self._builder is not None:
+            self.store.segment_store.discard_segment(self._builder)
+            self._builder = None